@@ -1,6 +1,5 @@
 import os
-import json
-from pathlib import Path
+from functools import lru_cache
 from aiogram import Bot, Dispatcher, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.utils.keyboard import InlineKeyboardBuilder
@@ -9,24 +8,13 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from dotenv import load_dotenv
 
-load_dotenv()
+# каталог читается через общий кэш, чтобы не парсить JSON на каждое нажатие
+from src.catalog import load_catalog, save_catalog
 
-CATALOG_PATH = Path("data") / "catalog.json"
+load_dotenv()
 
 
 # ---------- helpers ----------
-def load_catalog() -> dict:
-    if not CATALOG_PATH.exists():
-        CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        CATALOG_PATH.write_text('{"categories":[]}', encoding="utf-8")
-    return json.loads(CATALOG_PATH.read_text(encoding="utf-8"))
-
-
-def save_catalog(catalog: dict) -> None:
-    CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-    CATALOG_PATH.write_text(json.dumps(catalog, ensure_ascii=False, indent=2), encoding="utf-8")
-
-
 def is_admin(user_id: int) -> bool:
     raw = os.getenv("ADMIN_IDS", "").strip()
     if not raw:
@@ -35,6 +23,7 @@ def is_admin(user_id: int) -> bool:
     return user_id in admins
 
 
+@lru_cache(maxsize=2)
 def kb_main(user_is_admin: bool):
     kb = InlineKeyboardBuilder()
     kb.button(text="Категории", callback_data="cats")
@@ -64,6 +53,7 @@ def kb_books(cat_id: str, books: list[dict]):
     return kb.as_markup()
 
 
+@lru_cache(maxsize=1024)
 def kb_book_actions(book_id: str):
     kb = InlineKeyboardBuilder()
     kb.button(text="📥 Скачать", callback_data=f"dl:{book_id}")
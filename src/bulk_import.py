@@ -0,0 +1,117 @@
+import csv
+import io
+import json
+import re
+from pathlib import PurePath
+from typing import Any, Iterable, Iterator
+
+# колонки манифеста; обязательна только одна из file_name / file_id
+MANIFEST_COLUMNS = ("file_name", "file_id", "title", "author", "description", "category", "category_title")
+MANIFEST_EXTENSIONS = (".csv", ".json")
+
+# «Автор - Название.pdf», «Автор — Название.epub»
+_AUTHOR_SEP_RE = re.compile(r"\s+[-—–]\s+")
+
+def is_manifest(file_name: str) -> bool:
+    return file_name.lower().endswith(MANIFEST_EXTENSIONS)
+
+def valid_category_id(cat_id: str) -> bool:
+    return bool(cat_id) and all(ch.isalnum() or ch == "-" for ch in cat_id)
+
+def book_format(file_name: str, mime: str) -> str:
+    name = file_name.lower()
+    return "EPUB" if name.endswith(".epub") else ("PDF" if name.endswith(".pdf") else mime)
+
+def guess_from_filename(file_name: str) -> dict[str, str]:
+    stem = PurePath(file_name).stem.replace("_", " ").strip()
+    stem = " ".join(stem.split())
+    parts = _AUTHOR_SEP_RE.split(stem, maxsplit=1)
+    if len(parts) == 2 and all(parts):
+        return {"title": parts[1], "author": parts[0]}
+    return {"title": stem or file_name, "author": ""}
+
+def _clean_row(row: dict[str, Any]) -> dict[str, str]:
+    out = {}
+    for key, value in row.items():
+        if key is None:
+            # лишние ячейки строки csv
+            continue
+        key = key.strip().lower()
+        if key in MANIFEST_COLUMNS and value is not None:
+            out[key] = str(value).strip()
+    return out
+
+def iter_manifest(data: bytes, file_name: str) -> Iterator[dict[str, str]]:
+    # строки отдаются по одной: большой csv не превращается целиком в список словарей
+    if file_name.lower().endswith(".json"):
+        doc = json.loads(data.decode("utf-8-sig"))
+        rows = doc.get("books", []) if isinstance(doc, dict) else doc
+        if not isinstance(rows, list):
+            raise ValueError("Manifest must be a list of books")
+        for row in rows:
+            if isinstance(row, dict):
+                yield _clean_row(row)
+        return
+    text = io.TextIOWrapper(io.BytesIO(data), encoding="utf-8-sig", newline="")
+    head = text.readline()
+    text.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(head, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    try:
+        for row in csv.DictReader(text, dialect=dialect):
+            yield _clean_row(row)
+    except csv.Error as e:
+        raise ValueError(f"Bad CSV manifest: {e}") from e
+
+def plan_import(
+    files: list[dict[str, str]],
+    manifest: Iterable[dict[str, str]],
+    default_cat: str = "",
+) -> tuple[list[tuple[str, str, dict]], list[str]]:
+    # files — присланные документы; возвращает (категория, название категории, книга) и список проблем
+    by_name = {f["file_name"].casefold(): f for f in files if f.get("file_name")}
+    used: set[str] = set()
+    entries: list[tuple[str, str, dict]] = []
+    problems: list[str] = []
+
+    def add(row: dict[str, str], file: dict[str, str] | None) -> None:
+        file_name = row.get("file_name") or (file or {}).get("file_name", "")
+        cat_id = (row.get("category") or default_cat).lower()
+        if not cat_id:
+            problems.append(f"{file_name or row.get('title', '?')}: не указана категория")
+            return
+        if not valid_category_id(cat_id):
+            problems.append(f"{file_name or row.get('title', '?')}: плохой ID категории «{cat_id}»")
+            return
+        guessed = guess_from_filename(file_name) if file_name else {"title": "", "author": ""}
+        book = {
+            "title": row.get("title") or guessed["title"],
+            "author": row.get("author") or guessed["author"],
+            "description": row.get("description", ""),
+            "format": book_format(file_name, (file or {}).get("mime", "")),
+            "file_id": row.get("file_id") or (file or {}).get("file_id", ""),
+            "file_name": file_name,
+        }
+        if file and file.get("file_unique_id"):
+            book["file_unique_id"] = file["file_unique_id"]
+        if not book["title"]:
+            problems.append(f"строка без названия и имени файла: {row}")
+            return
+        entries.append((cat_id, row.get("category_title", ""), book))
+
+    for row in manifest:
+        file = by_name.get(row.get("file_name", "").casefold()) if row.get("file_name") else None
+        if file is None and not row.get("file_id"):
+            problems.append(f"{row.get('file_name') or row.get('title', '?')}: файл не прислан")
+            continue
+        if file is not None:
+            used.add(file["file_id"])
+        add(row, file)
+
+    # файлы без строки в манифесте — всё берём из имени файла
+    for file in files:
+        if file["file_id"] not in used:
+            add({}, file)
+    return entries, problems
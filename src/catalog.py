@@ -1,66 +1,584 @@
-import json
+import asyncio
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, Hashable, Iterable
+
+from .interprocess import SharedVersion, WriteLock
+from .metrics import (
+    CATALOG_LOAD_SECONDS, CATALOG_SAVE_OPS, CATALOG_SAVE_SECONDS, CATALOG_SIZE, SEARCH_SECONDS, result_bucket
+)
+from .records import Book, BookHit, FrozenDict, freeze
+from .search import SearchIndex, tokenize
+from .storage import CatalogStorage, JsonStorage, Op, replay
 
 CATALOG_PATH = Path(__file__).resolve().parent.parent / "data" / "catalog.json"
 
-def load_catalog() -> dict[str, Any]:
-    if not CATALOG_PATH.exists():
-        CATALOG_PATH.parent.mkdir(parents=True, exist_ok=True)
-        CATALOG_PATH.write_text('{"categories":[]}', encoding="utf-8")
-    return json.loads(CATALOG_PATH.read_text(encoding="utf-8"))
+class CatalogSnapshot(FrozenDict):
+    # version растёт при каждой перезагрузке — по нему можно кэшировать производные данные;
+    # shard_versions — для каждой категории версия снапшота, в котором она последний раз менялась
+    __slots__ = ("version", "stamp", "index", "shard_versions")
+
+class MutableCatalog(dict):
+    # pending — изменения с момента load_catalog_for_update(), их save_catalog() отдаёт хранилищу
+    __slots__ = ("index", "pending", "base_stamp")
+
+class CatalogIndex:
+    __slots__ = (
+        "books", "book_cats", "cats", "suffixes", "by_file", "by_content", "_search", "_unindexed", "_search_lock"
+    )
+
+    def __init__(self, catalog: dict[str, Any], search: SearchIndex | None = None):
+        self.books: dict[str, dict] = {}
+        self.book_cats: dict[str, dict] = {}
+        self.cats: dict[str, dict] = {}
+        # "kitab" -> 3 если заняты kitab, kitab-2, kitab-3
+        self.suffixes: dict[str, int] = {}
+        # поиск дублей: file_unique_id -> id книги, (sha256, размер) -> id книги
+        self.by_file: dict[str, str] = {}
+        self.by_content: dict[tuple[str, int], str] = {}
+        self._search: SearchIndex | None = None
+        self._unindexed: list[tuple[str, dict]] = []
+        self._search_lock = threading.Lock()
+        for c in catalog.get("categories", []):
+            self.add_category(c)
+            for b in c.get("books", []):
+                self.add_book(c, b)
+        # search уже покрывает все книги каталога, дальше досыпаем только новые
+        self._search = search
+
+    def add_category(self, cat: dict) -> None:
+        self.cats.setdefault(cat.get("id"), cat)
+
+    def add_book(self, cat: dict, book: dict) -> None:
+        book_id = book.get("id")
+        if book_id in self.books:
+            return
+        self.books[book_id] = book
+        self.book_cats[book_id] = cat
+        if self._search is not None:
+            self._unindexed.append((book_id, book))
+        if book.get("file_unique_id"):
+            self.by_file.setdefault(book["file_unique_id"], book_id)
+        if book.get("sha256"):
+            self.by_content.setdefault((book["sha256"], book.get("size", 0)), book_id)
+        if not isinstance(book_id, str):
+            return
+        self.suffixes.setdefault(book_id, 1)
+        head, sep, tail = book_id.rpartition("-")
+        if sep and tail.isdigit() and int(tail) >= 2:
+            self.suffixes[head] = max(self.suffixes.get(head, 1), int(tail))
+
+    def updated(self, cats: Iterable[dict]) -> "CatalogIndex":
+        # копия индекса с новыми версиями категорий cats: книги остальных категорий заново не перебираются
+        index = object.__new__(CatalogIndex)
+        index.books = self.books.copy()
+        index.book_cats = self.book_cats.copy()
+        index.cats = self.cats.copy()
+        index.suffixes = self.suffixes.copy()
+        index.by_file = self.by_file.copy()
+        index.by_content = self.by_content.copy()
+        index._search = self.built_search()
+        index._unindexed = []
+        index._search_lock = threading.Lock()
+        for c in cats:
+            index.cats[c.get("id")] = c
+            for b in c.get("books", []):
+                if b.get("id") in index.books:
+                    index.books[b.get("id")] = b
+                    index.book_cats[b.get("id")] = c
+                else:
+                    index.add_book(c, b)
+        return index
+
+    def unique_book_id(self, base_id: str) -> str:
+        if base_id not in self.books:
+            return base_id
+        n = max(self.suffixes.get(base_id, 1) + 1, 2)
+        while f"{base_id}-{n}" in self.books:
+            n += 1
+        return f"{base_id}-{n}"
+
+    def search(self) -> SearchIndex:
+        # индекс строит один поток, одновременные первые запросы ждут его, а не строят каждый свой
+        with self._search_lock:
+            if self._search is None:
+                self._search = SearchIndex.build(self.books.items())
+                self._unindexed = []
+            elif self._unindexed:
+                self._search = self._search.with_books(self._unindexed)
+                self._unindexed = []
+            return self._search
+
+    def has_search(self) -> bool:
+        return self._search is not None
+
+    def built_search(self) -> SearchIndex | None:
+        # поисковый индекс без принудительной постройки: None, если его ещё никто не запрашивал
+        return self.search() if self.has_search() else None
+
+    def warm_search(self) -> None:
+        # строим индекс в фоне: первый поиск после полной перезагрузки не ждёт постройку с нуля
+        threading.Thread(target=self.search, name="catalog-search-warm", daemon=True).start()
+
+def _compact_book(book: Mapping[str, Any]) -> Book:
+    return book if isinstance(book, Book) else Book(book)
+
+def _compact_category(cat: dict) -> FrozenDict:
+    return FrozenDict(
+        (k, tuple(_compact_book(b) for b in v) if k == "books" else freeze(v)) for k, v in cat.items()
+    )
+
+def _compact(catalog: dict[str, Any]) -> CatalogSnapshot:
+    return CatalogSnapshot(
+        (k, tuple(_compact_category(c) for c in v) if k == "categories" else freeze(v)) for k, v in catalog.items()
+    )
+
+def _thaw(obj: Any) -> Any:
+    if isinstance(obj, Book):
+        # книги в каталоге только добавляются, не правятся — копия для записи делит их со снапшотом
+        return obj
+    if isinstance(obj, dict):
+        return {k: _thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_thaw(v) for v in obj]
+    return obj
+
+# номера версий общие для всех кэшей, чтобы после set_storage() версия не повторилась
+_versions = itertools.count(1)
+
+# при общем счётчике хранилище всё равно проверяем раз в столько секунд — на случай ручной правки файла
+SHARED_RECHECK_SECONDS = 5.0
+# без общего счётчика снапшот, проверенный не раньше стольких секунд назад, отдаём из цикла событий без stat
+STAMP_RECHECK_SECONDS = 1.0
+
+class CatalogCache:
+    def __init__(self, storage: CatalogStorage, shared: SharedVersion | None = None):
+        self.storage = storage
+        # счётчик изменений, общий для всех процессов-воркеров: пока он не сдвинулся, хранилище не трогаем
+        self.shared = shared
+        self._seen_shared: int | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._snapshot: CatalogSnapshot | None = None
+        self._stamp: Hashable = None
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+        self.partial_reloads = 0
+
+    def _install(self, catalog: dict[str, Any], stamp: Hashable, search: SearchIndex | None = None) -> CatalogSnapshot:
+        snapshot = _compact(catalog)
+        self._version = next(_versions)
+        snapshot.version = self._version
+        snapshot.shard_versions = {c.get("id"): self._version for c in snapshot.get("categories", ())}
+        snapshot.stamp = stamp
+        snapshot.index = CatalogIndex(snapshot, search)
+        return self._publish_snapshot(snapshot)
+
+    def _advance(self, ops: list[Op], stamp: Hashable) -> CatalogSnapshot:
+        # следующий снапшот из текущего и изменений ops: пересобираются только затронутые категории,
+        # остальные (вместе с их книгами) переходят в новый снапшот как есть
+        old = self._snapshot
+        # уже известные книги пропускаем, как и полный replay: первая запись с этим id побеждает
+        ops = [op for op in ops if op[0] == "category" or op[2].get("id") not in old.index.books]
+        if not ops:
+            # нового ничего: тот же снапшот с новой отметкой, производные кэши остаются в силе
+            old.stamp = stamp
+            self._stamp = stamp
+            return old
+        touched = {cat_id for _, cat_id, _ in ops}
+        part = {"categories": [
+            {**c, "books": list(c.get("books", ()))} for c in old.get("categories", ()) if c.get("id") in touched
+        ]}
+        replay(part, ops)
+        changed = {c["id"]: _compact_category(c) for c in part["categories"]}
+        cats = [changed.pop(c.get("id"), c) for c in old.get("categories", ())]
+        cats.extend(changed.values())
+        snapshot = CatalogSnapshot(old)
+        dict.__setitem__(snapshot, "categories", tuple(cats))
+        self._version = next(_versions)
+        snapshot.version = self._version
+        snapshot.shard_versions = {**old.shard_versions, **{cat_id: self._version for cat_id in touched}}
+        snapshot.stamp = stamp
+        snapshot.index = old.index.updated(c for c in cats if c.get("id") in touched)
+        return self._publish_snapshot(snapshot)
+
+    def _publish_snapshot(self, snapshot: CatalogSnapshot) -> CatalogSnapshot:
+        CATALOG_SIZE.labels(kind="books").set(len(snapshot.index.books))
+        CATALOG_SIZE.labels(kind="categories").set(len(snapshot.index.cats))
+        self._snapshot = snapshot
+        self._stamp = snapshot.stamp
+        return snapshot
+
+    def cached(self) -> CatalogSnapshot | None:
+        # снапшот без обращения к хранилищу, если он заведомо свежий; None — нужна проверка (в потоке)
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+        age = time.monotonic() - self._checked_at
+        if self.shared is not None:
+            fresh = self.shared.read() == self._seen_shared and age < SHARED_RECHECK_SECONDS
+        else:
+            fresh = age < STAMP_RECHECK_SECONDS
+        if not fresh:
+            return None
+        self.hits += 1
+        return snapshot
+
+    def get(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        seen = None
+        if self.shared is not None:
+            seen = self.shared.read()
+            fresh = time.monotonic() - self._checked_at < SHARED_RECHECK_SECONDS
+            if snapshot is not None and seen == self._seen_shared and fresh:
+                self.hits += 1
+                return snapshot
+        checked_at = time.monotonic()
+        stamp = self.storage.stamp()
+        if snapshot is not None and stamp == self._stamp:
+            self._mark_checked(seen, checked_at)
+            self.hits += 1
+            return snapshot
+        with self._lock:
+            if self._snapshot is not None and stamp == self._stamp:
+                self._mark_checked(seen, checked_at)
+                self.hits += 1
+                return self._snapshot
+            self.misses += 1
+            if self._snapshot is not None:
+                self.reloads += 1
+                started = time.perf_counter()
+                changes = self.storage.changes_since(self._stamp)
+                if changes is not None:
+                    self.partial_reloads += 1
+                    snapshot = self._advance(*changes)
+                    self._mark_checked(seen, checked_at)
+                    CATALOG_LOAD_SECONDS.labels(mode="partial").observe(time.perf_counter() - started)
+                    return snapshot
+            with CATALOG_LOAD_SECONDS.labels(mode="full").time():
+                catalog = self.storage.load()
+            # поиском уже пользовались — новый индекс нужен сразу, а не к первому запросу
+            searched = self._snapshot is not None and self._snapshot.index.has_search()
+            fresh = self._install(catalog, stamp)
+            self._mark_checked(seen, checked_at)
+            if searched:
+                fresh.index.warm_search()
+            return fresh
+
+    def _mark_checked(self, seen: int | None, checked_at: float) -> None:
+        # только когда снапшот уже соответствует проверенной отметке: раньше cached() и параллельные get()
+        # приняли бы старый снапшот за свежий для нового значения общего счётчика
+        self._seen_shared, self._checked_at = seen, checked_at
+
+    def put(self, catalog: dict[str, Any], stamp: Hashable) -> CatalogSnapshot:
+        # вызывается после записи: не перечитываем то, что только что сами записали
+        index = getattr(catalog, "index", None)
+        search = index.built_search() if index is not None else None
+        with self._lock:
+            return self._install(catalog, stamp, search)
+
+    def commit(self, catalog: dict[str, Any]) -> None:
+        ops = getattr(catalog, "pending", None)
+        if ops is None:
+            with CATALOG_SAVE_SECONDS.labels().time():
+                stamp = self.storage.save(catalog)
+            CATALOG_SAVE_OPS.labels().observe(0)
+            self.put(catalog, stamp)
+            self.publish()
+            return
+        with CATALOG_SAVE_SECONDS.labels().time():
+            before, after = self.storage.apply(catalog, ops)
+        CATALOG_SAVE_OPS.labels().observe(len(ops))
+        if before == catalog.base_stamp:
+            with self._lock:
+                # наш снапшот — ровно то, что было до записи: достраиваем его изменениями
+                advanced = self._snapshot is not None and self._snapshot.stamp == before
+                if advanced:
+                    self._advance(ops, after)
+            if not advanced:
+                self.put(catalog, after)
+        else:
+            # пока мы редактировали, хранилище поменял кто-то ещё — наша копия неполная
+            self.invalidate()
+        ops.clear()
+        catalog.base_stamp = after
+        self.publish()
+
+    def publish(self) -> None:
+        if self.shared is not None:
+            self.shared.bump()
+            # между нашей записью и bump мог записать и кто-то ещё — следующий get сверит хранилище
+            self._seen_shared = None
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._snapshot = None
+            self._stamp = None
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "partial_reloads": self.partial_reloads,
+            "version": self._version,
+        }
+
+_cache = CatalogCache(JsonStorage(CATALOG_PATH))
+
+def set_storage(storage: CatalogStorage) -> None:
+    global _cache
+    _cache = CatalogCache(storage, _cache.shared)
+
+def get_storage() -> CatalogStorage:
+    return _cache.storage
+
+# изменения каталога идут строго по одному: load_catalog_for_update() -> правки -> save_catalog()
+_write_lock = WriteLock()
+
+def catalog_write_lock() -> WriteLock:
+    return _write_lock
+
+def enable_multiprocess(base_path: Path = CATALOG_PATH) -> None:
+    # несколько процессов над одним каталогом: общий счётчик версий и блокировка записи через файлы рядом
+    _cache.shared = SharedVersion(base_path.with_suffix(".version"))
+    _write_lock.use_file(base_path.with_suffix(".lock"))
+
+def load_catalog() -> CatalogSnapshot:
+    return _cache.get()
+
+def load_catalog_for_update() -> MutableCatalog:
+    # снапшот из кэша общий для всех хендлеров, поэтому менять можно только копию
+    snapshot = load_catalog()
+    catalog = MutableCatalog(_thaw(snapshot))
+    catalog.index = CatalogIndex(catalog, snapshot.index.built_search())
+    catalog.pending = []
+    catalog.base_stamp = snapshot.stamp
+    return catalog
 
 def save_catalog(catalog: dict[str, Any]) -> None:
-    CATALOG_PATH.write_text(json.dumps(catalog, ensure_ascii=False, indent=2), encoding="utf-8")
+    _cache.commit(catalog)
+
+def cache_stats() -> dict[str, int]:
+    return _cache.stats()
+
+# чтение/запись файла и разбор JSON — в отдельных потоках, чтобы не останавливать цикл событий.
+# Поиск (первый запрос по снапшоту строит индекс) — в своём пуле, чтобы не занимать потоки навигации
+CATALOG_IO_WORKERS = 2
+CATALOG_SEARCH_WORKERS = 2
+_io_pool: ThreadPoolExecutor | None = None
+_search_pool: ThreadPoolExecutor | None = None
+
+def set_io_workers(max_workers: int, search_workers: int | None = None) -> None:
+    global _io_pool, _search_pool, CATALOG_IO_WORKERS, CATALOG_SEARCH_WORKERS
+    CATALOG_IO_WORKERS = max(1, max_workers)
+    if search_workers is not None:
+        CATALOG_SEARCH_WORKERS = max(1, search_workers)
+    for pool in (_io_pool, _search_pool):
+        if pool is not None:
+            pool.shutdown(wait=False)
+    _io_pool = _search_pool = None
+
+def _executor() -> ThreadPoolExecutor:
+    global _io_pool
+    if _io_pool is None:
+        _io_pool = ThreadPoolExecutor(max_workers=CATALOG_IO_WORKERS, thread_name_prefix="catalog-io")
+    return _io_pool
+
+def _search_executor() -> ThreadPoolExecutor:
+    global _search_pool
+    if _search_pool is None:
+        _search_pool = ThreadPoolExecutor(max_workers=CATALOG_SEARCH_WORKERS, thread_name_prefix="catalog-search")
+    return _search_pool
+
+async def _run_io(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_executor(), fn, *args)
+
+async def _run_search(fn, *args):
+    return await asyncio.get_running_loop().run_in_executor(_search_executor(), fn, *args)
+
+async def aload_catalog() -> CatalogSnapshot:
+    # попадание в кэш — сразу, в пул уходят только проверка хранилища и перечитывание
+    snapshot = _cache.cached()
+    if snapshot is not None:
+        return snapshot
+    return await _run_io(load_catalog)
+
+async def aload_catalog_for_update() -> MutableCatalog:
+    return await _run_io(load_catalog_for_update)
+
+async def asave_catalog(catalog: dict[str, Any]) -> None:
+    await _run_io(save_catalog, catalog)
 
 def get_categories(catalog: dict[str, Any]) -> list[dict]:
     return catalog.get("categories", [])
 
+def catalog_index(catalog: dict[str, Any]) -> CatalogIndex:
+    index = getattr(catalog, "index", None)
+    if index is None:
+        # обычный dict (не из load_catalog*) — индекс строится заново на каждый вызов
+        index = CatalogIndex(catalog)
+        if isinstance(catalog, MutableCatalog):
+            catalog.index = index
+    return index
+
 def get_category(catalog: dict[str, Any], cat_id: str) -> dict | None:
-    return next((c for c in get_categories(catalog) if c.get("id") == cat_id), None)
+    return catalog_index(catalog).cats.get(cat_id)
+
+def category_version(catalog: dict[str, Any], cat_id: str) -> int | None:
+    # версия снапшота, где категория менялась в последний раз: пока она та же, страницы категории можно не перестраивать
+    versions = getattr(catalog, "shard_versions", None)
+    return versions.get(cat_id) if versions is not None else None
 
 def get_book(catalog: dict[str, Any], book_id: str) -> dict | None:
-    for c in get_categories(catalog):
-        for b in c.get("books", []):
-            if b.get("id") == book_id:
-                return b
-    return None
-
-def search_books(catalog: dict[str, Any], query: str) -> list[dict]:
-    q = query.lower().strip()
-    if not q:
-        return []
-    results = []
-    for c in get_categories(catalog):
-        for b in c.get("books", []):
-            title = (b.get("title") or "").lower()
-            author = (b.get("author") or "").lower()
-            if q in title or q in author:
-                results.append({**b, "_category_title": c.get("title", "")})
-    return results
+    return catalog_index(catalog).books.get(book_id)
+
+def get_book_category(catalog: dict[str, Any], book_id: str) -> dict | None:
+    return catalog_index(catalog).book_cats.get(book_id)
+
+def _search_ids(catalog: dict[str, Any], query: str, limit: int | None) -> list[str]:
+    started = time.perf_counter()
+    book_ids = _find_ids(catalog, query, limit)
+    SEARCH_SECONDS.labels(results=result_bucket(len(book_ids))).observe(time.perf_counter() - started)
+    return book_ids
+
+def _find_ids(catalog: dict[str, Any], query: str, limit: int | None) -> list[str]:
+    index = catalog_index(catalog)
+    storage = get_storage()
+    # FTS хранилища отвечает только за актуальный снапшот, произвольный dict ищем по его индексу
+    use_fts = storage.supports_search and isinstance(catalog, CatalogSnapshot)
+    book_ids = storage.search(query, limit) if use_fts else []
+    if book_ids:
+        # в хранилище могут уже лежать книги новее нашего снапшота
+        return [b for b in book_ids if b in index.books]
+    return index.search().search(query, limit)
+
+# готовые выдачи поиска: (версия снапшота, нормализованный запрос) -> id книг по убыванию релевантности
+SEARCH_CACHE_SIZE = 512
+SEARCH_RESULTS_MAX = 500
+_search_cache: OrderedDict[tuple[int, str], list[str]] = OrderedDict()
+_search_cache_lock = threading.Lock()
+
+def clear_search_cache() -> None:
+    with _search_cache_lock:
+        _search_cache.clear()
+
+def normalize_query(query: str) -> str:
+    return " ".join(tokenize(query))
+
+def _cached_ids(key: tuple[int, str]) -> list[str] | None:
+    with _search_cache_lock:
+        hit = _search_cache.get(key)
+        if hit is not None:
+            _search_cache.move_to_end(key)
+        return hit
+
+def ranked_book_ids(catalog: dict[str, Any], query: str) -> list[str]:
+    version = getattr(catalog, "version", None)
+    if version is None:
+        return _search_ids(catalog, query, SEARCH_RESULTS_MAX)
+    key = (version, normalize_query(query))
+    hit = _cached_ids(key)
+    if hit is not None:
+        return hit
+    book_ids = _search_ids(catalog, key[1], SEARCH_RESULTS_MAX)
+    with _search_cache_lock:
+        _search_cache[key] = book_ids
+        while len(_search_cache) > SEARCH_CACHE_SIZE:
+            _search_cache.popitem(last=False)
+    return book_ids
+
+def search_books(catalog: dict[str, Any], query: str, limit: int | None = None) -> list[BookHit]:
+    index = catalog_index(catalog)
+    return [
+        BookHit(index.books[book_id], index.book_cats[book_id].get("title", ""))
+        for book_id in ranked_book_ids(catalog, query)[:limit]
+    ]
+
+def _record(catalog: dict[str, Any], op: Op) -> None:
+    pending = getattr(catalog, "pending", None)
+    if pending is not None:
+        pending.append(op)
+
+async def asearch_books(catalog: dict[str, Any], query: str, limit: int | None = None) -> list[BookHit]:
+    # первый поиск по снапшоту строит индекс — на большом каталоге это заметное время
+    return await _run_search(search_books, catalog, query, limit)
+
+async def aranked_book_ids(catalog: dict[str, Any], query: str) -> list[str]:
+    # листание готовой выдачи не ждёт в очереди пула поиска
+    version = getattr(catalog, "version", None)
+    hit = _cached_ids((version, normalize_query(query))) if version is not None else None
+    if hit is not None:
+        return hit
+    return await _run_search(ranked_book_ids, catalog, query)
 
 def upsert_category(catalog: dict[str, Any], cat_id: str, title: str) -> None:
-    cat = get_category(catalog, cat_id)
+    _upsert_category(catalog, catalog_index(catalog), cat_id, title)
+
+def _upsert_category(catalog: dict[str, Any], index: CatalogIndex, cat_id: str, title: str) -> None:
+    cat = index.cats.get(cat_id)
     if cat:
         cat["title"] = title
     else:
-        catalog.setdefault("categories", []).append({"id": cat_id, "title": title, "books": []})
+        cat = {"id": cat_id, "title": title, "books": []}
+        catalog.setdefault("categories", []).append(cat)
+        index.add_category(cat)
+    _record(catalog, ("category", cat_id, title))
 
 def add_book_to_category(catalog: dict[str, Any], cat_id: str, book: dict) -> None:
-    cat = get_category(catalog, cat_id)
+    _add_book(catalog, catalog_index(catalog), cat_id, book)
+
+def _add_book(catalog: dict[str, Any], index: CatalogIndex, cat_id: str, book: dict) -> None:
+    cat = index.cats.get(cat_id)
     if not cat:
         raise ValueError("Category not found")
     cat.setdefault("books", []).append(book)
+    index.add_book(cat, book)
+    _record(catalog, ("book", cat_id, book))
+
+def add_books(
+    catalog: dict[str, Any], entries: Iterable[tuple[str, str, dict]]
+) -> tuple[list[dict], list[tuple[dict, dict]]]:
+    # пакетное добавление: (категория, название категории, книга без id); недостающие категории создаются.
+    # id выдаются по тому же индексу суффиксов, что и ensure_unique_book_id, с учётом уже выданных в пакете.
+    # Дубли уже имеющихся (и добавленных раньше в этом же пакете) книг пропускаются: (книга, что уже есть).
+    # Весь пакет идёт через один индекс — у обычного dict catalog_index() каждый раз строит новый
+    index = catalog_index(catalog)
+    added = []
+    duplicates = []
+    for cat_id, cat_title, book in entries:
+        existing = _find_duplicate(index, book.get("file_unique_id", ""), book.get("sha256", ""), book.get("size", 0))
+        if existing is not None:
+            duplicates.append((book, existing))
+            continue
+        if cat_id not in index.cats:
+            _upsert_category(catalog, index, cat_id, cat_title or cat_id)
+        book = {"id": index.unique_book_id(slugify(book.get("title") or "book")), **book}
+        _add_book(catalog, index, cat_id, book)
+        added.append(book)
+    return added, duplicates
+
+def find_duplicate(
+    catalog: dict[str, Any], file_unique_id: str = "", sha256: str = "", size: int = 0
+) -> dict | None:
+    return _find_duplicate(catalog_index(catalog), file_unique_id, sha256, size)
+
+def _find_duplicate(index: CatalogIndex, file_unique_id: str, sha256: str, size: int) -> dict | None:
+    # тот же файл в Telegram или то же содержимое, присланное другим файлом
+    book_id = index.by_file.get(file_unique_id) if file_unique_id else None
+    if book_id is None and sha256:
+        book_id = index.by_content.get((sha256, size))
+    return index.books.get(book_id) if book_id is not None else None
 
 def ensure_unique_book_id(catalog: dict[str, Any], base_id: str) -> str:
-    if not get_book(catalog, base_id):
-        return base_id
-    n = 2
-    while True:
-        candidate = f"{base_id}-{n}"
-        if not get_book(catalog, candidate):
-            return candidate
-        n += 1
+    return catalog_index(catalog).unique_book_id(base_id)
 
 def slugify(s: str) -> str:
     s = s.strip().lower()
@@ -0,0 +1,53 @@
+import json
+from collections.abc import Mapping
+from typing import Any
+
+# JSON для каталога и журнала: orjson или msgspec, если установлены (pip install orjson), иначе стандартный json.
+# Все три пишут UTF-8 без \u-экранирования, так что файлы взаимозаменяемы
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+def _default(obj: Any) -> Any:
+    # книги снапшота (records.Book) — Mapping, но не dict
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+if orjson is not None:
+    CODEC = "orjson"
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_INDENT_2 if pretty else 0)
+
+    loads = orjson.loads
+    DecodeError: type[Exception] = orjson.JSONDecodeError
+elif msgspec is not None:
+    CODEC = "msgspec"
+    _encoder = msgspec.json.Encoder(enc_hook=_default)
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        data = _encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if pretty else data
+
+    loads = msgspec.json.decode
+    DecodeError = msgspec.DecodeError
+else:
+    CODEC = "json"
+
+    def dumps(obj: Any, pretty: bool = False) -> bytes:
+        if pretty:
+            return json.dumps(obj, ensure_ascii=False, indent=2, default=_default).encode("utf-8")
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+    def loads(data: bytes | str) -> Any:
+        return json.loads(data)
+
+    DecodeError = json.JSONDecodeError
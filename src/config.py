@@ -8,6 +8,45 @@ load_dotenv()
 class Config:
     bot_token: str
     admin_ids: set[int]
+    # json — data/catalog.json, sqlite — база рядом, binary — снимок data/catalog.bin (путь — CATALOG_DB_PATH)
+    catalog_backend: str = "json"
+    catalog_db_path: str = ""
+    # потоки для чтения/записи каталога вне цикла событий
+    catalog_io_workers: int = 2
+    catalog_search_workers: int = 2
+    # polling — долгий опрос getUpdates, webhook — aiohttp-сервер за обратным прокси
+    run_mode: str = "polling"
+    webhook_url: str = ""
+    webhook_path: str = "/webhook"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_secret: str = ""
+    # сколько апдейтов обрабатывается одновременно (в каждом воркере)
+    max_concurrent_updates: int = 100
+    # ограничения частоты: на пользователя (поиск/скачивание/навигация) и общий темп отправки в Bot API
+    user_rate_limits: bool = True
+    outbound_rate: int = 30
+    # сколько секунд Telegram кэширует ответ на inline-запрос
+    inline_cache_time: int = 300
+    # процессов-воркеров; больше одного — только с вебхуком и общим FSM-хранилищем
+    workers: int = 1
+    # где хранится состояние диалогов: memory (один процесс), redis (общий для воркеров), sqlite (один узел)
+    fsm_storage: str = "memory"
+    redis_url: str = "redis://localhost:6379/0"
+    fsm_db_path: str = "data/fsm.sqlite3"
+    # брошенный на полпути диалог забывается через столько секунд (0 — никогда)
+    fsm_ttl: int = 86400
+    # порт /metrics в формате Prometheus (0 — выключено); у воркера i порт metrics_port + i
+    metrics_port: int = 0
+    metrics_host: str = "0.0.0.0"
+
+def _int_env(name: str, default: int) -> int:
+    raw = os.getenv(name, "").strip()
+    if not raw:
+        return default
+    if not raw.isdigit():
+        raise RuntimeError(f"{name} must be a number")
+    return int(raw)
 
 def load_config() -> Config:
     token = os.getenv("BOT_TOKEN", "").strip()
@@ -22,5 +61,44 @@ def load_config() -> Config:
             if x.isdigit():
                 admins.add(int(x))
 
+    backend = os.getenv("CATALOG_BACKEND", "json").strip().lower() or "json"
+    if backend not in ("json", "sqlite", "binary"):
+        raise RuntimeError("CATALOG_BACKEND must be json, sqlite or binary")
+
+    mode = os.getenv("BOT_MODE", "polling").strip().lower() or "polling"
+    if mode not in ("polling", "webhook"):
+        raise RuntimeError("BOT_MODE must be polling or webhook")
+    webhook_url = os.getenv("WEBHOOK_URL", "").strip().rstrip("/")
+    if mode == "webhook" and not webhook_url:
+        raise RuntimeError("WEBHOOK_URL is required for BOT_MODE=webhook")
+
+    fsm_storage = os.getenv("FSM_STORAGE", "memory").strip().lower() or "memory"
+    if fsm_storage not in ("memory", "redis", "sqlite"):
+        raise RuntimeError("FSM_STORAGE must be memory, redis or sqlite")
+
     # Можно оставить пустым — тогда админ-функции будут недоступны
-    return Config(bot_token=token, admin_ids=admins)
+    return Config(
+        bot_token=token,
+        admin_ids=admins,
+        catalog_backend=backend,
+        catalog_db_path=os.getenv("CATALOG_DB_PATH", "").strip(),
+        catalog_io_workers=_int_env("CATALOG_IO_WORKERS", 2),
+        catalog_search_workers=_int_env("CATALOG_SEARCH_WORKERS", 2),
+        run_mode=mode,
+        webhook_url=webhook_url,
+        webhook_path=os.getenv("WEBHOOK_PATH", "/webhook").strip() or "/webhook",
+        webhook_host=os.getenv("WEBHOOK_HOST", "0.0.0.0").strip() or "0.0.0.0",
+        webhook_port=_int_env("WEBHOOK_PORT", 8080),
+        webhook_secret=os.getenv("WEBHOOK_SECRET", "").strip(),
+        max_concurrent_updates=_int_env("MAX_CONCURRENT_UPDATES", 100),
+        workers=max(1, _int_env("BOT_WORKERS", 1)),
+        inline_cache_time=_int_env("INLINE_CACHE_TIME", 300),
+        user_rate_limits=os.getenv("USER_RATE_LIMITS", "1").strip().lower() not in ("0", "false", "no"),
+        outbound_rate=max(1, _int_env("OUTBOUND_RATE", 30)),
+        fsm_storage=fsm_storage,
+        redis_url=os.getenv("REDIS_URL", "").strip() or "redis://localhost:6379/0",
+        fsm_db_path=os.getenv("FSM_DB_PATH", "").strip() or "data/fsm.sqlite3",
+        fsm_ttl=_int_env("FSM_TTL", 86400),
+        metrics_port=_int_env("METRICS_PORT", 0),
+        metrics_host=os.getenv("METRICS_HOST", "0.0.0.0").strip() or "0.0.0.0",
+    )
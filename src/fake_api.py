@@ -0,0 +1,95 @@
+import asyncio
+import itertools
+import json
+from collections import Counter
+from typing import Any
+
+from aiohttp import web
+
+# Локальная замена api.telegram.org для нагрузочных тестов: отвечает на вызовы Bot API
+# правдоподобными объектами и раздаёт через getUpdates то, что положили в push()
+
+BOT_USER = {"id": 100000, "is_bot": True, "first_name": "Bench", "username": "bench_bot"}
+
+class FakeBotAPI:
+    def __init__(self, latency: float = 0.0):
+        # latency — искусственная задержка каждого ответа, как сеть до настоящего Telegram
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._updates: asyncio.Queue[dict[str, Any]] = asyncio.Queue()
+        self._message_ids = itertools.count(1)
+        self._runner: web.AppRunner | None = None
+
+    def push(self, update: dict[str, Any]) -> None:
+        self._updates.put_nowait(update)
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        return f"http://{host}:{port}"
+
+    async def close(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _params(self, request: web.Request) -> dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json()
+        params = {}
+        for key, value in (await request.post()).items():
+            if isinstance(value, str) and value[:1] in "{[":
+                try:
+                    value = json.loads(value)
+                except ValueError:
+                    pass
+            params[key] = value
+        return params
+
+    def _message(self, params: dict[str, Any], **extra: Any) -> dict[str, Any]:
+        chat_id = int(params.get("chat_id") or 0)
+        message_id = params.get("message_id")
+        return {
+            "message_id": int(message_id) if message_id else next(self._message_ids),
+            "date": 0,
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+            **extra,
+        }
+
+    async def _get_updates(self, params: dict[str, Any]) -> list[dict[str, Any]]:
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+        out = []
+        try:
+            out.append(await asyncio.wait_for(self._updates.get(), timeout or 0.01))
+        except asyncio.TimeoutError:
+            return out
+        while len(out) < limit and not self._updates.empty():
+            out.append(self._updates.get_nowait())
+        return out
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"].lower()
+        params = await self._params(request)
+        self.calls[method] += 1
+        if self.latency and method != "getupdates":
+            await asyncio.sleep(self.latency)
+        if method == "getme":
+            result: Any = BOT_USER
+        elif method == "getupdates":
+            result = await self._get_updates(params)
+        elif method in ("sendmessage", "editmessagetext"):
+            result = self._message(params, text=str(params.get("text", "")))
+        elif method == "senddocument":
+            file_id = str(params.get("document", ""))
+            result = self._message(params, document={"file_id": file_id, "file_unique_id": file_id[-16:] or "x"})
+        else:
+            # answerCallbackQuery, answerInlineQuery, deleteWebhook и прочее, что отвечает true
+            result = True
+        return web.json_response({"ok": True, "result": result})
@@ -0,0 +1,203 @@
+import argparse
+import asyncio
+import time
+from collections import Counter
+
+# Заглушка сервера с протоколом Redis (RESP2), чтобы проверить FSM_STORAGE=redis без настоящего Redis:
+#   python -m src.fake_redis --port 6379   и   REDIS_URL=redis://127.0.0.1:6379/0
+# Понимает то, что нужно RedisStorage из aiogram: GET, SET с EX/PX/NX/XX, DEL, EXISTS, EXPIRE, TTL,
+# и служебные команды клиента (HELLO 2 и 3). Данные только в памяти, база одна на все SELECT
+
+def _simple(text: str) -> bytes:
+    return f"+{text}\r\n".encode()
+
+def _error(text: str) -> bytes:
+    return f"-ERR {text}\r\n".encode()
+
+def _int(n: int) -> bytes:
+    return f":{n}\r\n".encode()
+
+def _bulk(value: bytes | None) -> bytes:
+    if value is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(value), value)
+
+def _array(items: list[bytes]) -> bytes:
+    return b"*%d\r\n" % len(items) + b"".join(items)
+
+class FakeRedis:
+    def __init__(self):
+        self.data: dict[bytes, bytes] = {}
+        # ключ -> момент (time.monotonic), когда он истекает
+        self.expires: dict[bytes, float] = {}
+        self.commands: Counter[str] = Counter()
+        self._server: asyncio.AbstractServer | None = None
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._serve, host, port)
+        port = self._server.sockets[0].getsockname()[1]
+        return f"redis://{host}:{port}/0"
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_command(self, reader: asyncio.StreamReader) -> list[bytes] | None:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # строковая команда, как из telnet или redis-cli без RESP
+            return line.split()
+        args = []
+        for _ in range(int(line[1:])):
+            size = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(size + 2))[:-2])
+        return args
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        resp3 = False
+        try:
+            while (args := await self._read_command(reader)) is not None:
+                if args:
+                    reply = self.execute(args)
+                    if args[0].upper() == b"HELLO" and not reply.startswith(b"-"):
+                        resp3 = reply.startswith(b"%")
+                    if resp3 and reply == b"$-1\r\n":
+                        # в RESP3 у null свой тип
+                        reply = b"_\r\n"
+                    writer.write(reply)
+                    await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    def execute(self, args: list[bytes]) -> bytes:
+        name = args[0].decode().lower()
+        self.commands[name] += 1
+        handler = getattr(self, f"_cmd_{name}", None)
+        if handler is None:
+            return _error(f"unknown command '{name}'")
+        try:
+            return handler(*args[1:])
+        except (TypeError, ValueError):
+            return _error(f"wrong arguments for '{name}' command")
+
+    def _alive(self, key: bytes) -> bool:
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _cmd_ping(self, message: bytes | None = None) -> bytes:
+        return _simple("PONG") if message is None else _bulk(message)
+
+    def _cmd_echo(self, message: bytes) -> bytes:
+        return _bulk(message)
+
+    def _cmd_hello(self, protover: bytes | None = None, *options: bytes) -> bytes:
+        # redis-py 6+ начинает соединение с HELLO 3. Ответы остальных команд в RESP2 годятся и для RESP3,
+        # кроме null — его подменяет _serve; здесь отличается только сам ответ: map вместо массива
+        proto = 2 if protover is None else int(protover)
+        if proto not in (2, 3):
+            return b"-NOPROTO unsupported protocol version\r\n"
+        info = {"server": b"redis", "version": b"7.0.0", "proto": proto, "id": 1, "mode": b"standalone", "role": b"master"}
+        items = []
+        for key, value in info.items():
+            items.append(_bulk(key.encode()))
+            items.append(_int(value) if isinstance(value, int) else _bulk(value))
+        items += [_bulk(b"modules"), _array([])]
+        if proto == 3:
+            return b"%%%d\r\n" % (len(items) // 2) + b"".join(items)
+        return _array(items)
+
+    def _cmd_select(self, db: bytes) -> bytes:
+        int(db)
+        return _simple("OK")
+
+    def _cmd_client(self, *args: bytes) -> bytes:
+        # CLIENT SETINFO / SETNAME при подключении
+        return _simple("OK")
+
+    def _cmd_get(self, key: bytes) -> bytes:
+        return _bulk(self.data[key] if self._alive(key) else None)
+
+    def _cmd_set(self, key: bytes, value: bytes, *options: bytes) -> bytes:
+        ttl = None
+        only_new = only_existing = False
+        opts = iter(options)
+        for opt in opts:
+            opt = opt.upper()
+            if opt == b"EX":
+                ttl = int(next(opts))
+            elif opt == b"PX":
+                ttl = int(next(opts)) / 1000
+            elif opt == b"NX":
+                only_new = True
+            elif opt == b"XX":
+                only_existing = True
+            else:
+                raise ValueError(opt)
+        exists = self._alive(key)
+        if (only_new and exists) or (only_existing and not exists):
+            return _bulk(None)
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if ttl is not None:
+            self.expires[key] = time.monotonic() + ttl
+        return _simple("OK")
+
+    def _cmd_del(self, *keys: bytes) -> bytes:
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                del self.data[key]
+                self.expires.pop(key, None)
+                removed += 1
+        return _int(removed)
+
+    def _cmd_exists(self, *keys: bytes) -> bytes:
+        return _int(sum(self._alive(key) for key in keys))
+
+    def _cmd_expire(self, key: bytes, seconds: bytes) -> bytes:
+        if not self._alive(key):
+            return _int(0)
+        self.expires[key] = time.monotonic() + int(seconds)
+        return _int(1)
+
+    def _cmd_ttl(self, key: bytes) -> bytes:
+        if not self._alive(key):
+            return _int(-2)
+        deadline = self.expires.get(key)
+        return _int(-1 if deadline is None else max(0, round(deadline - time.monotonic())))
+
+    def _cmd_flushdb(self, *args: bytes) -> bytes:
+        self.data.clear()
+        self.expires.clear()
+        return _simple("OK")
+
+async def serve(host: str, port: int) -> None:
+    server = FakeRedis()
+    url = await server.start(host, port)
+    print(f"Заглушка Redis: {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.close()
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Заглушка сервера Redis для FSM_STORAGE=redis")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6379)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
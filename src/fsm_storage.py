@@ -0,0 +1,156 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from .config import Config
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fsm (
+    key TEXT PRIMARY KEY,
+    state TEXT,
+    data TEXT NOT NULL DEFAULT '{}',
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS fsm_updated ON fsm (updated_at);
+"""
+
+def _key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+class SqliteFSMStorage(BaseStorage):
+    # состояния диалогов переживают перезапуск; брошенные больше ttl секунд назад считаются пустыми
+    def __init__(self, path: Path, ttl: int | None = None):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._last_purge = 0.0
+
+    def _expired_before(self) -> float:
+        return time.time() - self.ttl if self.ttl else 0.0
+
+    def _read(self, key: str) -> tuple[str | None, dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT state, data FROM fsm WHERE key = ? AND updated_at >= ?",
+                (key, self._expired_before()),
+            ).fetchone()
+        if row is None:
+            return None, {}
+        return row[0], json.loads(row[1])
+
+    def _write(self, key: str, column: str, value: Any) -> None:
+        now = time.time()
+        with self._lock:
+            # просроченную запись начинаем с чистого листа
+            self._conn.execute("DELETE FROM fsm WHERE key = ? AND updated_at < ?", (key, self._expired_before()))
+            self._conn.execute(
+                f"INSERT INTO fsm (key, {column}, updated_at) VALUES (?, ?, ?) "
+                f"ON CONFLICT (key) DO UPDATE SET {column} = excluded.{column}, updated_at = excluded.updated_at",
+                (key, value, now),
+            )
+            if self.ttl and now - self._last_purge > self.ttl:
+                self._conn.execute("DELETE FROM fsm WHERE updated_at < ?", (now - self.ttl,))
+                self._last_purge = now
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await asyncio.to_thread(self._write, _key(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> str | None:
+        state, _ = await asyncio.to_thread(self._read, _key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: dict[str, Any]) -> None:
+        await asyncio.to_thread(self._write, _key(key), "data", json.dumps(data, ensure_ascii=False))
+
+    async def get_data(self, key: StorageKey) -> dict[str, Any]:
+        _, data = await asyncio.to_thread(self._read, _key(key))
+        return data
+
+    def _update(self, key: str, fn: Callable[[dict[str, Any]], None]) -> dict[str, Any]:
+        # BEGIN IMMEDIATE берёт блокировку записи файла — другие процессы ждут, а не затирают друг друга
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM fsm WHERE key = ? AND updated_at < ?", (key, self._expired_before()))
+                row = self._conn.execute("SELECT data FROM fsm WHERE key = ?", (key,)).fetchone()
+                data = json.loads(row[0]) if row else {}
+                fn(data)
+                self._conn.execute(
+                    "INSERT INTO fsm (key, data, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+                    (key, json.dumps(data, ensure_ascii=False), now),
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+        return data
+
+    async def update_data_atomic(self, key: StorageKey, fn: Callable[[dict[str, Any]], None]) -> dict[str, Any]:
+        # не update_data: тот FSMContext зовёт с data=..., и его смысл (слить словарь) остаётся как в BaseStorage
+        return await asyncio.to_thread(self._update, _key(key), fn)
+
+    def state_counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT state, COUNT(*) FROM fsm WHERE state IS NOT NULL AND updated_at >= ? GROUP BY state",
+                (self._expired_before(),),
+            ).fetchall()
+        return dict(rows)
+
+    async def close(self) -> None:
+        self._conn.close()
+
+def fsm_state_counts(storage: BaseStorage) -> dict[str, int] | None:
+    # None — хранилище не умеет посчитать дёшево (Redis пришлось бы сканировать целиком)
+    if isinstance(storage, SqliteFSMStorage):
+        return storage.state_counts()
+    if isinstance(storage, MemoryStorage):
+        counts: dict[str, int] = {}
+        for record in list(storage.storage.values()):
+            if record.state:
+                counts[record.state] = counts.get(record.state, 0) + 1
+        return counts
+    return None
+
+def atomic_updates(storage: BaseStorage) -> bool:
+    # можно ли править данные FSM разом из нескольких процессов (см. update_data ниже)
+    return isinstance(storage, SqliteFSMStorage)
+
+async def update_data(
+    storage: BaseStorage, key: StorageKey, fn: Callable[[dict[str, Any]], None]
+) -> dict[str, Any]:
+    # чтение, правка fn и запись данных FSM одной операцией; атомарно против других процессов — только в SQLite
+    if isinstance(storage, SqliteFSMStorage):
+        return await storage.update_data_atomic(key, fn)
+    data = await storage.get_data(key)
+    fn(data)
+    await storage.set_data(key, data)
+    return data
+
+def make_fsm_storage(cfg: Config) -> BaseStorage:
+    ttl = cfg.fsm_ttl or None
+    if cfg.fsm_storage == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError as e:
+            raise RuntimeError("FSM_STORAGE=redis needs the redis package: pip install 'redis>=5'") from e
+        # подойдёт любой сервер с протоколом Redis (KeyDB, Dragonfly, локальная заглушка для тестов)
+        return RedisStorage.from_url(cfg.redis_url, state_ttl=ttl, data_ttl=ttl)
+    if cfg.fsm_storage == "sqlite":
+        return SqliteFSMStorage(Path(cfg.fsm_db_path), ttl=ttl)
+    return MemoryStorage()
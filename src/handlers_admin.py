@@ -1,16 +1,34 @@
-from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+import asyncio
+import logging
+import os
+import tempfile
+from pathlib import PurePath
+
+from aiogram import Bot, Router, F
+from aiogram.methods import EditMessageText
+from aiogram.types import Document, Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 
-from .states import AdminAddFlow
+from .states import AdminAddFlow, AdminBulkFlow
+from .fsm_storage import atomic_updates, update_data
+from .bulk_import import book_format, is_manifest, iter_manifest, plan_import
 from .catalog import (
-    load_catalog, save_catalog, upsert_category,
-    add_book_to_category, ensure_unique_book_id, slugify
+    aload_catalog, aload_catalog_for_update, asave_catalog, upsert_category, add_books, find_duplicate,
+    add_book_to_category, ensure_unique_book_id, slugify, catalog_write_lock, cache_stats, get_book
 )
-from .keyboards import kb_admin_add_category, kb_main
+from .metadata import ainspect_file
+from .metrics import LOOP_LAG
+from .outbox import Outbox
+from .ratelimit import OUTBOUND, USER_LIMITS
+from .keyboards import kb_admin_add_category, kb_admin_confirm_meta, kb_admin_duplicate, kb_book_actions, kb_main
+
+log = logging.getLogger(__name__)
 
 router = Router()
 
+# Bot API отдаёт ботам файлы не больше 20 МБ
+MAX_DOWNLOAD_BYTES = 20 << 20
+
 def admin_only(user_id: int, admin_ids: set[int]) -> bool:
     return user_id in admin_ids
 
@@ -33,31 +51,108 @@ async def admin_cancel(m: Message, state: FSMContext, admin_ids: set[int]):
     if not admin_only(m.from_user.id, admin_ids):
         return
     await state.clear()
+    _bulk_locks.pop(m.from_user.id, None)
     await m.answer("Отменено.", reply_markup=kb_main(True))
 
+@router.message(F.text == "/stats")
+async def admin_stats(m: Message, admin_ids: set[int], outbox: Outbox):
+    if not admin_only(m.from_user.id, admin_ids):
+        return
+    stats = cache_stats()
+    limits = USER_LIMITS.stats()
+    out = OUTBOUND.stats()
+    queue = outbox.stats()
+    await m.answer(
+        "Кэш каталога: "
+        f"попаданий {stats['hits']}, промахов {stats['misses']}, перезагрузок {stats['reloads']} "
+        f"(частичных {stats['partial_reloads']})\n"
+        f"Задержки цикла событий: {LOOP_LAG.summary()}\n"
+        f"Лимиты пользователей: пропущено {limits['allowed']}, отклонено {limits['limited']}\n"
+        f"Отправка: {out['sent']} запросов, ждали лимита {out['delayed']}, 429 — {out['retry_after']}\n"
+        f"Очередь отправки: в очереди {queue['queued']}, отправлено {queue['sent']}, "
+        f"схлопнуто {queue['skipped']}, повторов {queue['retries']}, ошибок {queue['failed']}"
+    )
+
 @router.callback_query(F.data == "admin:cancel")
 async def admin_cancel_cb(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
     if not admin_only(c.from_user.id, admin_ids):
         await c.answer("Нет доступа", show_alert=True)
         return
     await state.clear()
+    _bulk_locks.pop(c.from_user.id, None)
     await c.message.edit_text("Отменено.", reply_markup=kb_main(True))
     await c.answer()
 
+async def inspect_document(bot: Bot, doc: Document) -> tuple[dict[str, str], str, int]:
+    # (метаданные, sha256, размер); sha256 пустой, если файл скачать не удалось
+    if (doc.file_size or 0) > MAX_DOWNLOAD_BYTES:
+        return {}, "", 0
+    fd, path = tempfile.mkstemp(suffix=PurePath(doc.file_name or "").suffix)
+    os.close(fd)
+    try:
+        # файл пишется на диск по частям, разбор читает из него только нужные куски
+        await bot.download(doc, destination=path)
+        return await ainspect_file(path, doc.file_name or "")
+    except Exception as e:
+        log.warning("can't inspect %s: %r", doc.file_name, e)
+        return {}, "", 0
+    finally:
+        os.unlink(path)
+
+async def ask_book_details(state: FSMContext, send, prefix: str = "") -> None:
+    # send — c.message.edit_text или m.answer; если в файле нашлись данные, админу остаётся подтвердить
+    meta = (await state.get_data()).get("meta")
+    if not meta:
+        await state.set_state(AdminAddFlow.waiting_title)
+        await send(f"{prefix}Введите название книги:")
+        return
+    await state.set_state(AdminAddFlow.waiting_meta_confirm)
+    await send(
+        f"{prefix}Нашёл в файле:\n"
+        f"📘 {meta['title']}\n"
+        f"✍️ {meta.get('author') or '—'}\n"
+        f"{meta.get('description', '')}".rstrip() + "\n\nСохранить так?",
+        reply_markup=kb_admin_confirm_meta()
+    )
+
 @router.message(AdminAddFlow.waiting_file, F.document)
-async def admin_got_file(m: Message, state: FSMContext, admin_ids: set[int]):
+async def admin_got_file(m: Message, state: FSMContext, admin_ids: set[int], bot: Bot):
     if not admin_only(m.from_user.id, admin_ids):
         return
 
     doc = m.document
     file_id = doc.file_id
     file_name = doc.file_name or ""
-    mime = doc.mime_type or ""
-    fmt = "EPUB" if file_name.lower().endswith(".epub") else ("PDF" if file_name.lower().endswith(".pdf") else mime)
+    fmt = book_format(file_name, doc.mime_type or "")
+
+    catalog = await aload_catalog()
+    # file_unique_id сверяем сразу — если файл уже в каталоге, качать его незачем
+    existing = find_duplicate(catalog, doc.file_unique_id)
+    meta, sha256, size = ({}, "", 0) if existing else await inspect_document(bot, doc)
+    if existing is None and sha256:
+        existing = find_duplicate(catalog, sha256=sha256, size=size)
 
-    await state.update_data(file_id=file_id, file_name=file_name, format=fmt)
+    await state.update_data(
+        file_id=file_id, file_name=file_name, format=fmt,
+        file_unique_id=doc.file_unique_id, sha256=sha256, size=size,
+    )
+    if meta.get("title"):
+        await state.update_data(meta=meta)
 
-    catalog = load_catalog()
+    if existing is not None:
+        await state.set_state(AdminAddFlow.waiting_duplicate_choice)
+        await state.update_data(duplicate_of=existing["id"])
+        await m.answer(
+            "Эта книга уже есть в каталоге:\n"
+            f"ID: {existing['id']}\n"
+            f"{existing.get('title', '')} {('— ' + existing['author']) if existing.get('author') else ''}",
+            reply_markup=kb_admin_duplicate()
+        )
+        return
+
+    await ask_category(m, state, catalog)
+
+async def ask_category(m: Message, state: FSMContext, catalog: dict) -> None:
     cats = catalog.get("categories", [])
     await state.set_state(AdminAddFlow.waiting_cat_choice)
 
@@ -71,6 +166,33 @@ async def admin_got_file(m: Message, state: FSMContext, admin_ids: set[int]):
 
     await m.answer("Выберите категорию для книги:", reply_markup=kb_admin_add_category(cats))
 
+@router.callback_query(AdminAddFlow.waiting_duplicate_choice, F.data == "admin:dup_link")
+async def admin_dup_link(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
+    if not admin_only(c.from_user.id, admin_ids):
+        await c.answer("Нет доступа", show_alert=True)
+        return
+    book_id = (await state.get_data()).get("duplicate_of", "")
+    await state.clear()
+    book = get_book(await aload_catalog(), book_id)
+    if not book:
+        await c.message.edit_text("Книга уже удалена. Пришлите файл заново.", reply_markup=kb_main(True))
+        await c.answer()
+        return
+    # новую запись не создаём — показываем карточку существующей
+    await c.message.edit_text(
+        f"Новая запись не создана, используется существующая:\n📘 {book.get('title')}\nID: {book_id}",
+        reply_markup=kb_book_actions(book_id)
+    )
+    await c.answer()
+
+@router.callback_query(AdminAddFlow.waiting_duplicate_choice, F.data == "admin:dup_new")
+async def admin_dup_new(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
+    if not admin_only(c.from_user.id, admin_ids):
+        await c.answer("Нет доступа", show_alert=True)
+        return
+    await c.answer()
+    await ask_category(c.message, state, await aload_catalog())
+
 @router.callback_query(AdminAddFlow.waiting_cat_choice, F.data.startswith("admin:set_cat:"))
 async def admin_set_cat(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
     if not admin_only(c.from_user.id, admin_ids):
@@ -78,8 +200,7 @@ async def admin_set_cat(c: CallbackQuery, state: FSMContext, admin_ids: set[int]
         return
     cat_id = c.data.split(":", 2)[2]
     await state.update_data(cat_id=cat_id)
-    await state.set_state(AdminAddFlow.waiting_title)
-    await c.message.edit_text("Введите название книги:")
+    await ask_book_details(state, c.message.edit_text)
     await c.answer()
 
 @router.callback_query(AdminAddFlow.waiting_cat_choice, F.data == "admin:new_cat")
@@ -111,12 +232,12 @@ async def admin_new_cat_title(m: Message, state: FSMContext, admin_ids: set[int]
     data = await state.get_data()
     cat_id = data["cat_id"]
 
-    catalog = load_catalog()
-    upsert_category(catalog, cat_id, title)
-    save_catalog(catalog)
+    async with catalog_write_lock():
+        catalog = await aload_catalog_for_update()
+        upsert_category(catalog, cat_id, title)
+        await asave_catalog(catalog)
 
-    await state.set_state(AdminAddFlow.waiting_title)
-    await m.answer("Категория создана.\nТеперь введите название книги:")
+    await ask_book_details(state, m.answer, "Категория создана.\n")
 
 @router.message(AdminAddFlow.waiting_title, F.text)
 async def admin_title(m: Message, state: FSMContext, admin_ids: set[int]):
@@ -145,31 +266,183 @@ async def admin_description(m: Message, state: FSMContext, admin_ids: set[int]):
     if desc == "-":
         desc = ""
 
+    await state.update_data(description=desc)
+    text = await save_book(await state.get_data())
+    await state.clear()
+    await m.answer(text, reply_markup=kb_main(True))
+
+@router.callback_query(AdminAddFlow.waiting_meta_confirm, F.data == "admin:meta_ok")
+async def admin_meta_ok(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
+    if not admin_only(c.from_user.id, admin_ids):
+        await c.answer("Нет доступа", show_alert=True)
+        return
     data = await state.get_data()
-    catalog = load_catalog()
-
-    base_id = slugify(data.get("title", "book"))
-    book_id = ensure_unique_book_id(catalog, base_id)
-
-    book = {
-        "id": book_id,
-        "title": data.get("title", ""),
-        "author": data.get("author", ""),
-        "description": desc,
-        "format": data.get("format", ""),
-        "file_id": data.get("file_id", ""),
-        "file_name": data.get("file_name", "")
-    }
+    text = await save_book({**data, **data["meta"]})
+    await state.clear()
+    await c.message.edit_text(text, reply_markup=kb_main(True))
+    await c.answer()
 
+@router.callback_query(AdminAddFlow.waiting_meta_confirm, F.data == "admin:meta_edit")
+async def admin_meta_edit(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
+    if not admin_only(c.from_user.id, admin_ids):
+        await c.answer("Нет доступа", show_alert=True)
+        return
+    await state.set_state(AdminAddFlow.waiting_title)
+    await c.message.edit_text("Введите название книги:")
+    await c.answer()
+
+async def save_book(data: dict) -> str:
     cat_id = data["cat_id"]
-    add_book_to_category(catalog, cat_id, book)
-    save_catalog(catalog)
 
-    await state.clear()
-    await m.answer(
+    # id выбираем под блокировкой, иначе два админа могут получить одинаковый
+    async with catalog_write_lock():
+        catalog = await aload_catalog_for_update()
+
+        base_id = slugify(data.get("title", "book"))
+        book_id = ensure_unique_book_id(catalog, base_id)
+
+        book = {
+            "id": book_id,
+            "title": data.get("title", ""),
+            "author": data.get("author", ""),
+            "description": data.get("description", ""),
+            "format": data.get("format", ""),
+            "file_id": data.get("file_id", ""),
+            "file_name": data.get("file_name", ""),
+            "file_unique_id": data.get("file_unique_id", ""),
+            "sha256": data.get("sha256", ""),
+            "size": data.get("size", 0)
+        }
+
+        add_book_to_category(catalog, cat_id, book)
+        await asave_catalog(catalog)
+
+    return (
         "Готово. Книга добавлена:\n"
         f"ID: {book_id}\n"
         f"{book['title']} {('— ' + book['author']) if book['author'] else ''}\n"
-        f"Категория: {cat_id}",
-        reply_markup=kb_main(True)
+        f"Категория: {cat_id}"
+    )
+
+# книг на один шаг импорта: между шагами цикл событий отвечает остальным и обновляется прогресс
+BULK_CHUNK = 500
+# сколько проблем показать в отчёте — сообщение Telegram не длиннее 4096 символов
+BULK_REPORT_PROBLEMS = 20
+
+# сообщения альбома приходят почти одновременно: файл дописываем в FSM через update_data, а замок
+# в процессе нужен, чтобы сообщение-счётчик создал только первый файл
+_bulk_locks: dict[int, asyncio.Lock] = {}
+
+def _bulk_status_text(data: dict) -> str:
+    manifest = data.get("bulk_manifest")
+    return (
+        f"Принято файлов: {len(data.get('bulk_files', []))}\n"
+        f"Манифест: {manifest['file_name'] if manifest else 'нет'}\n"
+        "Когда всё отправлено: /done"
+    )
+
+@router.message((F.text == "/import") | F.text.startswith("/import "))
+async def admin_bulk_start(m: Message, state: FSMContext, admin_ids: set[int], workers: int = 1):
+    if not admin_only(m.from_user.id, admin_ids):
+        return
+    if workers > 1 and not atomic_updates(state.storage):
+        # файлы альбома разойдутся по разным процессам, и без атомарной записи часть из них потеряется
+        await m.answer("Пакетный импорт при BOT_WORKERS > 1 работает только с FSM_STORAGE=sqlite.")
+        return
+    default_cat = m.text.partition(" ")[2].strip().lower()
+    await state.set_state(AdminBulkFlow.collecting)
+    await state.set_data({"bulk_cat": default_cat, "bulk_files": [], "bulk_manifest": None})
+    await m.answer(
+        "Пакетный импорт.\n"
+        "Пришлите файлы книг — можно альбомом или пересылкой, и, если нужно, манифест CSV/JSON "
+        "с колонками file_name, file_id, title, author, description, category, category_title.\n"
+        "Чего нет в манифесте, берётся из имени файла: «Автор - Название.pdf».\n"
+        f"Категория по умолчанию: {default_cat or 'не задана (/import <ID категории>)'}\n\n"
+        "Когда всё отправлено: /done\n"
+        "Чтобы отменить: /cancel"
     )
+
+@router.message(AdminBulkFlow.collecting, F.document)
+async def admin_bulk_file(m: Message, state: FSMContext, admin_ids: set[int], outbox: Outbox):
+    if not admin_only(m.from_user.id, admin_ids):
+        return
+    doc = m.document
+    file_name = doc.file_name or ""
+    entry = {
+        "file_id": doc.file_id,
+        "file_unique_id": doc.file_unique_id,
+        "file_name": file_name,
+        "mime": doc.mime_type or "",
+    }
+
+    def add(data: dict) -> None:
+        if is_manifest(file_name):
+            data["bulk_manifest"] = {"file_id": doc.file_id, "file_name": file_name}
+        else:
+            data.setdefault("bulk_files", []).append(entry)
+
+    async with _bulk_locks.setdefault(m.from_user.id, asyncio.Lock()):
+        data = await update_data(state.storage, state.key, add)
+        # одно сообщение-счётчик на весь импорт вместо ответа на каждый файл
+        status_id = data.get("bulk_status")
+        if status_id is None:
+            status_id = (await m.answer(_bulk_status_text(data))).message_id
+            await update_data(state.storage, state.key, lambda d: d.setdefault("bulk_status", status_id))
+        else:
+            outbox.put(EditMessageText(chat_id=m.chat.id, message_id=status_id, text=_bulk_status_text(data)))
+
+@router.message(AdminBulkFlow.collecting, F.text == "/done")
+async def admin_bulk_done(m: Message, state: FSMContext, admin_ids: set[int], bot: Bot, outbox: Outbox):
+    if not admin_only(m.from_user.id, admin_ids):
+        return
+    data = await state.get_data()
+    files = data.get("bulk_files", [])
+    manifest = data.get("bulk_manifest")
+    if not files and not manifest:
+        await m.answer("Пока ничего не прислано. Пришлите файлы или манифест, либо /cancel.")
+        return
+
+    status = await m.answer("Импорт: разбираю файлы…")
+
+    def progress(text: str, **kwargs) -> None:
+        # правки одного сообщения в очереди схлопываются — уходит только последняя
+        outbox.put(EditMessageText(chat_id=status.chat.id, message_id=status.message_id, text=text, **kwargs))
+
+    rows = []
+    if manifest:
+        buf = await bot.download(manifest["file_id"])
+        rows = iter_manifest(buf.getvalue(), manifest["file_name"])
+    try:
+        entries, problems = plan_import(files, rows, data.get("bulk_cat", ""))
+    except ValueError as e:
+        progress(f"Не удалось прочитать манифест: {e}\nИсправьте и пришлите заново, затем /done.")
+        return
+
+    added = []
+    new_cats = 0
+    if entries:
+        progress(f"Импорт: 0/{len(entries)}")
+        # весь пакет — одна запись в хранилище
+        async with catalog_write_lock():
+            catalog = await aload_catalog_for_update()
+            cats_before = len(catalog.get("categories", []))
+            for start in range(0, len(entries), BULK_CHUNK):
+                chunk_added, duplicates = add_books(catalog, entries[start:start + BULK_CHUNK])
+                added += chunk_added
+                problems += [f"{book['title']}: уже есть как {existing['id']}" for book, existing in duplicates]
+                progress(f"Импорт: {min(start + BULK_CHUNK, len(entries))}/{len(entries)}")
+                await asyncio.sleep(0)
+            await asave_catalog(catalog)
+            new_cats = len(catalog.get("categories", [])) - cats_before
+
+    await state.clear()
+    _bulk_locks.pop(m.from_user.id, None)
+    lines = [f"Импорт завершён. Добавлено книг: {len(added)}"]
+    if new_cats:
+        lines.append(f"Новых категорий: {new_cats}")
+    if problems:
+        lines.append(f"Пропущено: {len(problems)}")
+        lines += [f"• {p[:150]}" for p in problems[:BULK_REPORT_PROBLEMS]]
+        if len(problems) > BULK_REPORT_PROBLEMS:
+            lines.append(f"… и ещё {len(problems) - BULK_REPORT_PROBLEMS}")
+    progress("\n".join(lines), reply_markup=kb_main(True))
@@ -0,0 +1,45 @@
+import hashlib
+
+from aiogram import Router
+from aiogram.types import InlineQuery, InlineQueryResultCachedDocument
+
+from .catalog import aload_catalog, aranked_book_ids, get_book, get_book_category
+
+router = Router()
+
+# Telegram показывает не больше 50 результатов за ответ
+INLINE_PAGE_SIZE = 20
+
+def _result_id(book_id: str) -> str:
+    # id результата ограничен 64 байтами, а кириллический id книги бывает длиннее
+    return hashlib.md5(book_id.encode("utf-8")).hexdigest()
+
+@router.inline_query()
+async def inline_search(q: InlineQuery, inline_cache_time: int):
+    query = q.query.strip()
+    if not query:
+        await q.answer([], cache_time=inline_cache_time, is_personal=False)
+        return
+
+    catalog = await aload_catalog()
+    ranked = await aranked_book_ids(catalog, query)
+    # отдать можно только книги с загруженным файлом
+    ranked = [b for b in ranked if (get_book(catalog, b) or {}).get("file_id")]
+
+    offset = int(q.offset) if q.offset.isdigit() else 0
+    page = ranked[offset:offset + INLINE_PAGE_SIZE]
+    results = []
+    for book_id in page:
+        book = get_book(catalog, book_id)
+        cat = get_book_category(catalog, book_id) or {}
+        author = book.get("author", "")
+        results.append(InlineQueryResultCachedDocument(
+            id=_result_id(book_id),
+            title=book.get("title", ""),
+            document_file_id=book["file_id"],
+            description=" · ".join(x for x in (author, cat.get("title", "")) if x),
+            caption=f"{book.get('title')} — {author}" if author else book.get("title", ""),
+        ))
+
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(ranked) else ""
+    await q.answer(results, cache_time=inline_cache_time, is_personal=False, next_offset=next_offset)
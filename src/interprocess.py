@@ -0,0 +1,76 @@
+import asyncio
+import fcntl
+import mmap
+import os
+import struct
+from pathlib import Path
+
+class SharedVersion:
+    # счётчик в файле, отображённом в память: читается без системных вызовов, все процессы видят одно значение
+    def __init__(self, path: Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < 8:
+                os.ftruncate(fd, 8)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            self._mm = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+        self._path = path
+
+    def read(self) -> int:
+        return struct.unpack_from("<Q", self._mm, 0)[0]
+
+    def bump(self) -> int:
+        with open(self._path, "rb") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            value = self.read() + 1
+            struct.pack_into("<Q", self._mm, 0, value)
+        return value
+
+# как часто пробовать взять занятый соседним процессом flock
+LOCK_POLL_SECONDS = 0.02
+
+class WriteLock:
+    # asyncio-блокировка внутри процесса, плюс (если задан файл) flock между процессами
+    def __init__(self, path: Path | None = None):
+        self._local = asyncio.Lock()
+        self._path = path
+        self._fd: int | None = None
+
+    def use_file(self, path: Path | None) -> None:
+        self._path = path
+
+    async def __aenter__(self) -> "WriteLock":
+        await self._local.acquire()
+        if self._path is not None:
+            try:
+                self._path.parent.mkdir(parents=True, exist_ok=True)
+                fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+            except BaseException:
+                self._local.release()
+                raise
+            try:
+                # не блокирующий flock в цикле: ожидание можно отменить, и тогда fd закрывается,
+                # а блокировка не достаётся потоку, которого уже никто не ждёт
+                while True:
+                    try:
+                        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        await asyncio.sleep(LOCK_POLL_SECONDS)
+            except BaseException:
+                os.close(fd)
+                self._local.release()
+                raise
+            self._fd = fd
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        if self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+        self._local.release()
@@ -0,0 +1,301 @@
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import resource
+import shutil
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.types import TelegramObject, Update
+
+from .catalog import aload_catalog, set_storage
+from .config import Config
+from .fake_api import BOT_USER, FakeBotAPI
+from .main import build_dispatcher
+from .metrics import HANDLER_SECONDS
+from .storage import migrate_json_to_binary, migrate_json_to_sqlite, open_storage
+from .synthetic import make_catalog, sample_queries
+
+# Нагрузочный прогон хендлеров без настоящего Telegram:
+#   python -m src.loadtest --books 1000 20000 200000 --updates 20000 --users 200
+#   python -m src.loadtest --mode polling --rate 1000 --api-latency 0.05
+# feed — виртуальные пользователи кликают по очереди (с поиском через FSM), апдейты идут прямо в диспетчер;
+# polling — апдейты с заданным темпом раздаёт getUpdates фейкового сервера, поиск — inline-запросами
+
+class LatencyRecorder(BaseMiddleware):
+    def __init__(self):
+        self.samples: list[float] = []
+        # тип исключения -> сколько раз; в polling aiogram их только логирует, считаем здесь
+        self.errors: Counter[str] = Counter()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            self.errors[f"{type(e).__name__}: {e}"[:120]] += 1
+            raise
+        finally:
+            self.samples.append(time.perf_counter() - started)
+
+class UpdateFactory:
+    def __init__(self):
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _user(self, user_id: int) -> dict[str, Any]:
+        return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+    def message(self, user_id: int, text: str) -> dict[str, Any]:
+        return {"update_id": next(self._update_ids), "message": {
+            "message_id": next(self._message_ids), "date": int(time.time()), "text": text,
+            "chat": {"id": user_id, "type": "private"}, "from": self._user(user_id),
+        }}
+
+    def callback(self, user_id: int, data: str) -> dict[str, Any]:
+        update_id = next(self._update_ids)
+        return {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "chat_instance": str(user_id), "data": data, "from": self._user(user_id),
+            "message": {
+                "message_id": user_id, "date": int(time.time()), "text": "…",
+                "chat": {"id": user_id, "type": "private"}, "from": BOT_USER,
+            },
+        }}
+
+    def inline(self, user_id: int, query: str) -> dict[str, Any]:
+        update_id = next(self._update_ids)
+        return {"update_id": update_id, "inline_query": {
+            "id": str(update_id), "query": query, "offset": "", "from": self._user(user_id),
+        }}
+
+class Workload:
+    # сценарии поведения пользователей поверх конкретного каталога
+    def __init__(self, catalog: dict[str, Any], seed: int, search_share: float):
+        self.rng = random.Random(seed)
+        self.cats = [c for c in catalog["categories"] if c["books"]]
+        self.queries = sample_queries(catalog, 1000, seed)
+        self.search_share = search_share
+        self.updates = UpdateFactory()
+
+    def _book(self) -> tuple[dict, dict]:
+        cat = self.rng.choice(self.cats)
+        return cat, self.rng.choice(cat["books"])
+
+    def session(self, user_id: int) -> list[dict[str, Any]]:
+        # последовательность апдейтов одного пользователя, порядок важен (FSM поиска)
+        u = self.updates
+        if self.rng.random() < self.search_share:
+            cat, book = self._book()
+            return [
+                u.callback(user_id, "search:ask"),
+                u.message(user_id, self.rng.choice(self.queries)),
+                u.callback(user_id, "sr:p1"),
+                u.callback(user_id, f"book:{book['id']}"),
+            ]
+        cat, book = self._book()
+        pages = (len(cat["books"]) + 9) // 10
+        return [
+            u.message(user_id, "/start"),
+            u.callback(user_id, "cats"),
+            u.callback(user_id, f"cat:{cat['id']}"),
+            u.callback(user_id, f"cat:{cat['id']}:p{self.rng.randrange(pages)}"),
+            u.callback(user_id, f"book:{book['id']}"),
+            u.callback(user_id, f"dl:{book['id']}"),
+        ]
+
+    def stateless(self, user_id: int) -> dict[str, Any]:
+        # для polling: апдейты, которым не важен порядок
+        u = self.updates
+        if self.rng.random() < self.search_share:
+            return u.inline(user_id, self.rng.choice(self.queries))
+        cat, book = self._book()
+        return self.rng.choice((
+            u.callback(user_id, "cats"),
+            u.callback(user_id, f"cat:{cat['id']}"),
+            u.callback(user_id, f"book:{book['id']}"),
+            u.callback(user_id, f"dl:{book['id']}"),
+        ))
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # не Linux — хотя бы пиковое значение
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def percentile(samples: list[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+async def run_feed(dp, bot: Bot, workload: Workload, total: int, users: int) -> None:
+    sent = 0
+
+    async def user(user_id: int) -> None:
+        nonlocal sent
+        while sent < total:
+            for raw in workload.session(user_id):
+                sent += 1
+                update = Update.model_validate(raw, context={"bot": bot})
+                try:
+                    await dp.feed_update(bot, update)
+                except Exception:
+                    # уже посчитано в LatencyRecorder
+                    pass
+
+    await asyncio.gather(*(user(100 + i) for i in range(users)))
+
+async def run_polling(dp, bot: Bot, api: FakeBotAPI, recorder: LatencyRecorder, workload: Workload,
+                      total: int, users: int, rate: float) -> None:
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, polling_timeout=1))
+    started = time.perf_counter()
+    for n in range(total):
+        api.push(workload.stateless(100 + n % users))
+        # открытая модель нагрузки: темп не зависит от того, успевает ли бот
+        delay = started + (n + 1) / rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    while len(recorder.samples) < total:
+        await asyncio.sleep(0.05)
+    await dp.stop_polling()
+    await polling
+
+async def run_scenario(args, books: int, dp, bot: Bot, api: FakeBotAPI, recorder: LatencyRecorder) -> dict[str, Any]:
+    workdir = Path(tempfile.mkdtemp(prefix="loadtest-"))
+    try:
+        return await _run_scenario(args, books, workdir, dp, bot, api, recorder)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+async def _run_scenario(args, books: int, workdir: Path, dp, bot: Bot, api: FakeBotAPI,
+                        recorder: LatencyRecorder) -> dict[str, Any]:
+    catalog = make_catalog(books, seed=args.seed)
+    json_path = workdir / "catalog.json"
+    json_path.write_text(json.dumps(catalog, ensure_ascii=False), encoding="utf-8")
+    db_path = workdir / ("catalog.bin" if args.backend == "binary" else "catalog.sqlite3")
+    if args.backend == "sqlite":
+        migrate_json_to_sqlite(json_path, db_path)
+    elif args.backend == "binary":
+        migrate_json_to_binary(json_path, db_path)
+    set_storage(open_storage(args.backend, json_path, db_path))
+
+    started = time.perf_counter()
+    await aload_catalog()
+    load_seconds = time.perf_counter() - started
+
+    workload = Workload(catalog, args.seed, args.search_share)
+    del catalog
+    recorder.samples.clear()
+    recorder.errors.clear()
+    HANDLER_SECONDS.clear()
+    api.calls.clear()
+
+    started = time.perf_counter()
+    if args.mode == "feed":
+        await run_feed(dp, bot, workload, args.updates, args.users)
+    else:
+        await run_polling(dp, bot, api, recorder, workload, args.updates, args.users, args.rate)
+    wall = time.perf_counter() - started
+    # всё, что хендлеры поставили в очередь отправки, должно уйти до конца замера
+    await dp["outbox"].close()
+    drained = time.perf_counter() - started
+
+    samples = recorder.samples
+    slowest = sorted(
+        ((key[0], h.quantile(0.99)) for key, h in HANDLER_SECONDS.items()),
+        key=lambda kv: -kv[1],
+    )[:3]
+    return {
+        "books": books,
+        "updates": len(samples),
+        "errors": sum(recorder.errors.values()),
+        "error_kinds": dict(recorder.errors.most_common(5)),
+        "load_s": round(load_seconds, 3),
+        "throughput": round(len(samples) / wall, 1) if wall else 0.0,
+        "drain_s": round(drained - wall, 3),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 2),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 2),
+        "max_ms": round(max(samples, default=0) * 1000, 2),
+        "rss_mb": round(rss_mb(), 1),
+        "api_calls": sum(api.calls.values()),
+        "slowest_p99_ms": {name: round(q * 1000, 2) for name, q in slowest},
+    }
+
+async def run(args) -> list[dict[str, Any]]:
+    api = FakeBotAPI(latency=args.api_latency)
+    base = await api.start()
+    cfg = Config(
+        bot_token="100000:loadtest",
+        admin_ids=set(),
+        user_rate_limits=args.rate_limits,
+        outbound_rate=1_000_000,
+        max_concurrent_updates=args.concurrency,
+    )
+    bot = Bot(token=cfg.bot_token, session=AiohttpSession(api=TelegramAPIServer.from_base(base)))
+    # замер снаружи лимитов: отброшенные апдейты тоже считаются, а ожидание семафора входит в задержку
+    recorder = LatencyRecorder()
+    dp = build_dispatcher(cfg, bot, outer=(recorder,))
+    results = []
+    try:
+        for books in args.books:
+            result = await run_scenario(args, books, dp, bot, api, recorder)
+            results.append(result)
+            print(
+                f"{books:>7} книг: {result['throughput']:>8} апд/с  "
+                f"p50 {result['p50_ms']} мс  p99 {result['p99_ms']} мс  max {result['max_ms']} мс  "
+                f"загрузка {result['load_s']} с  RSS {result['rss_mb']} МБ  ошибок {result['errors']}"
+            )
+            if result["slowest_p99_ms"]:
+                print("         медленнее всего (p99 ≤):", result["slowest_p99_ms"])
+            if result["errors"]:
+                # задержки исключений ничего не говорят о хендлерах — такой прогон не годится для сравнения
+                print(f"         !!! ОШИБКИ В ХЕНДЛЕРАХ: {result['errors']} из {result['updates']}, замер недействителен")
+                for kind, count in result["error_kinds"].items():
+                    print(f"         {count:>7} × {kind}")
+    finally:
+        await bot.session.close()
+        await api.close()
+    return results
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Нагрузочный прогон бота на фейковом Bot API")
+    parser.add_argument("--books", type=int, nargs="+", default=[1_000, 20_000, 200_000])
+    parser.add_argument("--updates", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--mode", choices=("feed", "polling"), default="feed")
+    parser.add_argument("--rate", type=float, default=1000.0, help="апдейтов в секунду в режиме polling")
+    parser.add_argument("--search-share", type=float, default=0.3)
+    parser.add_argument("--api-latency", type=float, default=0.0, help="задержка ответа фейкового API, с")
+    parser.add_argument("--backend", choices=("json", "sqlite", "binary"), default="json")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--rate-limits", action="store_true", help="включить лимиты на пользователя")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", type=Path, help="сохранить результаты в файл")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    if args.json:
+        args.json.write_text(json.dumps(results, ensure_ascii=False, indent=2), encoding="utf-8")
+    if any(result["errors"] for result in results):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
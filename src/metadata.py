@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import html
+import logging
+import multiprocessing
+import re
+import zipfile
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import BinaryIO
+from xml.etree import ElementTree
+
+log = logging.getLogger(__name__)
+
+METADATA_WORKERS = 2
+METADATA_TIMEOUT = 30.0
+DESCRIPTION_MAX = 1000
+
+# сколько читаем с конца PDF в поисках trailer, сколько — от начала объекта Info
+PDF_TAIL_BYTES = 64 * 1024
+PDF_OBJECT_BYTES = 16 * 1024
+PDF_SCAN_CHUNK = 1 << 20
+# OPF больше этого — скорее испорченный или подсунутый файл, не разжимаем
+EPUB_OPF_MAX = 1 << 20
+
+_CONTAINER_NS = "{urn:oasis:names:tc:opendocument:xmlns:container}"
+_OPF_NS = "{http://www.idpf.org/2007/opf}"
+_DC_NS = "{http://purl.org/dc/elements/1.1/}"
+_TAG_RE = re.compile(r"<[^>]+>")
+
+def _clean(text: str | None, limit: int = 300) -> str:
+    text = " ".join(html.unescape(_TAG_RE.sub(" ", text or "")).split())
+    return text[:limit].rstrip()
+
+def _epub_metadata(path: str) -> dict[str, str]:
+    # zipfile читает оглавление архива и только нужные члены, остальное содержимое книги не трогаем
+    with zipfile.ZipFile(path) as z:
+        container = ElementTree.fromstring(z.read("META-INF/container.xml"))
+        rootfile = container.find(f".//{_CONTAINER_NS}rootfile")
+        if rootfile is None or not rootfile.get("full-path"):
+            return {}
+        opf_name = rootfile.get("full-path")
+        if z.getinfo(opf_name).file_size > EPUB_OPF_MAX:
+            return {}
+        opf = ElementTree.fromstring(z.read(opf_name))
+    md = opf.find(f"{_OPF_NS}metadata")
+    if md is None:
+        return {}
+    title = md.find(f"{_DC_NS}title")
+    authors = [_clean(c.text) for c in md.findall(f"{_DC_NS}creator")]
+    desc = md.find(f"{_DC_NS}description")
+    return {
+        "title": _clean(title.text if title is not None else ""),
+        "author": ", ".join(a for a in authors if a),
+        "description": _clean(desc.text if desc is not None else "", DESCRIPTION_MAX),
+    }
+
+_STARTXREF_RE = re.compile(rb"startxref\s+(\d+)")
+_INFO_REF_RE = re.compile(rb"/Info\s+(\d+)\s+(\d+)\s+R")
+_PREV_RE = re.compile(rb"/Prev\s+(\d+)")
+_ESCAPES = {ord("n"): b"\n", ord("r"): b"\r", ord("t"): b"\t", ord("b"): b"\b", ord("f"): b"\f"}
+
+def _pdf_literal(data: bytes, i: int) -> bytes:
+    # data[i] == "("; скобки внутри строки бывают вложенными, \ экранирует
+    out = bytearray()
+    depth = 1
+    i += 1
+    while i < len(data) and depth:
+        ch = data[i]
+        if ch == 0x5C and i + 1 < len(data):
+            nxt = data[i + 1]
+            if nxt in _ESCAPES:
+                out += _ESCAPES[nxt]
+                i += 2
+            elif 0x30 <= nxt <= 0x37:
+                j = i + 1
+                while j < min(i + 4, len(data)) and 0x30 <= data[j] <= 0x37:
+                    j += 1
+                out.append(int(data[i + 1:j], 8) & 0xFF)
+                i = j
+            elif nxt in b"\r\n":
+                # перенос строки внутри строки-литерала
+                i += 3 if data[i + 1:i + 3] == b"\r\n" else 2
+            else:
+                out.append(nxt)
+                i += 2
+            continue
+        if ch == 0x28:
+            depth += 1
+        elif ch == 0x29:
+            depth -= 1
+            if not depth:
+                break
+        out.append(ch)
+        i += 1
+    return bytes(out)
+
+def _pdf_text(raw: bytes) -> str:
+    if raw.startswith(b"\xfe\xff"):
+        return raw[2:].decode("utf-16-be", "replace")
+    if raw.startswith(b"\xef\xbb\xbf"):
+        return raw[3:].decode("utf-8", "replace")
+    # PDFDocEncoding в печатной части совпадает с latin-1
+    return raw.decode("latin-1")
+
+def _pdf_value(obj: bytes, key: bytes) -> str:
+    m = re.search(rb"/" + key + rb"\s*", obj)
+    if not m:
+        return ""
+    i = m.end()
+    if obj[i:i + 1] == b"(":
+        return _pdf_text(_pdf_literal(obj, i))
+    if obj[i:i + 1] == b"<" and obj[i + 1:i + 2] != b"<":
+        end = obj.find(b">", i)
+        hexstr = re.sub(rb"\s+", b"", obj[i + 1:end])
+        if len(hexstr) % 2:
+            hexstr += b"0"
+        try:
+            return _pdf_text(bytes.fromhex(hexstr.decode("ascii")))
+        except ValueError:
+            return ""
+    # косвенная ссылка или что-то экзотическое — не разбираем
+    return ""
+
+def _xref_offset(f: BinaryIO, start: int, num: int) -> int | None:
+    # классическая таблица xref: записи по 20 байт, поэтому нужную находим seek'ом, не читая остальные
+    seen = set()
+    while start is not None and start not in seen:
+        seen.add(start)
+        f.seek(start)
+        if f.readline().strip() != b"xref":
+            # xref-поток (PDF 1.5+) — пусть ищет сканирование
+            return None
+        while True:
+            line = f.readline()
+            if not line:
+                return None
+            line = line.strip()
+            if line.startswith(b"trailer"):
+                m = _PREV_RE.search(line + f.read(2048))
+                start = int(m.group(1)) if m else None
+                break
+            parts = line.split()
+            if len(parts) != 2 or not all(p.isdigit() for p in parts):
+                return None
+            first, count = int(parts[0]), int(parts[1])
+            if first <= num < first + count:
+                f.seek((num - first) * 20, 1)
+                entry = f.read(20).split()
+                if len(entry) >= 3 and entry[2] == b"n" and entry[0].isdigit():
+                    return int(entry[0])
+                return None
+            f.seek(count * 20, 1)
+    return None
+
+def _scan_offset(f: BinaryIO, num: int, gen: int) -> int | None:
+    pattern = re.compile(rb"(?<!\d)%d\s+%d\s+obj\b" % (num, gen))
+    found = None
+    pos = 0
+    overlap = b""
+    f.seek(0)
+    while True:
+        chunk = f.read(PDF_SCAN_CHUNK)
+        if not chunk:
+            return found
+        data = overlap + chunk
+        for m in pattern.finditer(data):
+            # последнее определение объекта — актуальное после инкрементальных правок
+            found = pos - len(overlap) + m.start()
+        pos += len(chunk)
+        overlap = data[-64:]
+
+def _pdf_metadata(path: str) -> dict[str, str]:
+    with open(path, "rb") as f:
+        size = f.seek(0, 2)
+        f.seek(max(0, size - PDF_TAIL_BYTES))
+        tail = f.read()
+        refs = _INFO_REF_RE.findall(tail)
+        starts = _STARTXREF_RE.findall(tail)
+        start = int(starts[-1]) if starts else None
+        if not refs and start is not None:
+            # в xref-потоке словарь trailer лежит в самом потоке
+            f.seek(start)
+            refs = _INFO_REF_RE.findall(f.read(4096))
+        if not refs:
+            return {}
+        num, gen = int(refs[-1][0]), int(refs[-1][1])
+        offset = _xref_offset(f, start, num) if start is not None else None
+        if offset is None:
+            offset = _scan_offset(f, num, gen)
+        if offset is None:
+            return {}
+        f.seek(offset)
+        obj = f.read(PDF_OBJECT_BYTES)
+    end = obj.find(b"endobj")
+    if end != -1:
+        obj = obj[:end]
+    return {
+        "title": _clean(_pdf_value(obj, b"Title")),
+        "author": _clean(_pdf_value(obj, b"Author")),
+        "description": _clean(_pdf_value(obj, b"Subject"), DESCRIPTION_MAX),
+    }
+
+def extract_metadata(path: str, file_name: str = "") -> dict[str, str]:
+    # только непустые поля: title, author, description
+    name = (file_name or path).lower()
+    with open(path, "rb") as f:
+        magic = f.read(5)
+    if name.endswith(".epub") or magic.startswith(b"PK"):
+        meta = _epub_metadata(path)
+    elif name.endswith(".pdf") or magic == b"%PDF-":
+        meta = _pdf_metadata(path)
+    else:
+        return {}
+    return {k: v for k, v in meta.items() if v}
+
+def file_digest(path: str) -> tuple[str, int]:
+    h = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while chunk := f.read(PDF_SCAN_CHUNK):
+            h.update(chunk)
+            size += len(chunk)
+    return h.hexdigest(), size
+
+def inspect_file(path: str, file_name: str = "") -> tuple[dict[str, str], str, int]:
+    # метаданные и отпечаток содержимого за один заход в пул
+    try:
+        meta = extract_metadata(path, file_name)
+    except Exception as e:
+        log.warning("metadata extraction failed for %s: %r", file_name or path, e)
+        meta = {}
+    return (meta, *file_digest(path))
+
+_pool: Executor | None = None
+
+def _executor() -> Executor:
+    global _pool
+    if _pool is None:
+        if multiprocessing.current_process().daemon:
+            # воркеры BOT_WORKERS — daemon-процессы, своих дочерних им заводить нельзя
+            _pool = ThreadPoolExecutor(max_workers=METADATA_WORKERS, thread_name_prefix="metadata")
+        else:
+            _pool = ProcessPoolExecutor(max_workers=METADATA_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+async def ainspect_file(path: str, file_name: str = "") -> tuple[dict[str, str], str, int]:
+    # разбор большого PDF и хэш — чистый CPU и диск, в цикле событий им не место
+    loop = asyncio.get_running_loop()
+    return await asyncio.wait_for(loop.run_in_executor(_executor(), inspect_file, path, file_name), METADATA_TIMEOUT)
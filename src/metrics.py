@@ -0,0 +1,207 @@
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+log = logging.getLogger(__name__)
+
+# границы корзин в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        # последняя корзина — всё, что больше самой верхней границы
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+    def quantile(self, q: float) -> float:
+        # верхняя граница корзины, в которую попадает квантиль
+        if not self.count:
+            return 0.0
+        need = q * self.count
+        seen = 0
+        for bound, n in zip(self.buckets, self.counts):
+            seen += n
+            if seen >= need:
+                return bound
+        return self.max
+
+    def summary(self) -> str:
+        if not self.count:
+            return "n=0"
+        return (
+            f"n={self.count} avg={self.sum / self.count * 1000:.2f}ms "
+            f"p50≤{self.quantile(0.5) * 1000:g}ms p99≤{self.quantile(0.99) * 1000:g}ms "
+            f"max={self.max * 1000:.1f}ms"
+        )
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, n: float = 1.0) -> None:
+        self.value += n
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+_KINDS = {"histogram": Histogram, "counter": Counter, "gauge": Gauge}
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _number(value: float) -> str:
+    # полная точность: :g оставил бы 6 знаков, и счётчик за миллион перестал бы расти для rate()
+    if value != value:
+        return "NaN"
+    if value in (float("inf"), float("-inf")):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(float(value))
+
+def _labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Metric:
+    # семейство однотипных метрик с метками, как в Prometheus: HANDLER_SECONDS.labels(handler="cb_book")
+    def __init__(self, name: str, help: str, kind: str, labelnames: tuple[str, ...] = (), **kwargs):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self._kwargs = kwargs
+        self._children: dict[tuple[str, ...], Histogram | Counter | Gauge] = {}
+        REGISTRY.append(self)
+
+    def labels(self, *values: str, **kv: str):
+        key = tuple(str(v) for v in values) or tuple(str(kv[n]) for n in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = _KINDS[self.kind](**self._kwargs)
+        return child
+
+    def clear(self) -> None:
+        self._children.clear()
+
+    def items(self) -> list[tuple[tuple[str, ...], Histogram | Counter | Gauge]]:
+        return list(self._children.items())
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            if isinstance(child, Histogram):
+                seen = 0
+                for bound, n in zip(child.buckets, child.counts):
+                    seen += n
+                    le = 'le="%g"' % bound
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {seen}")
+                le = 'le="+Inf"'
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {child.count}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(child.sum)}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {child.count}")
+            else:
+                lines.append(f"{self.name}{_labels(self.labelnames, key)} {_number(child.value)}")
+        return lines
+
+REGISTRY: list[Metric] = []
+# значения, которые дешевле посчитать при запросе /metrics, чем обновлять на каждом событии
+COLLECTORS: list[Callable[[], None]] = []
+
+def render_metrics() -> str:
+    for collect in COLLECTORS:
+        try:
+            collect()
+        except Exception as e:
+            log.warning("metrics collector %s failed: %r", getattr(collect, "__name__", collect), e)
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.render()
+    return "\n".join(lines) + "\n"
+
+# размеры выдачи поиска и пакетов записи — это штуки, а не секунды
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+UPDATES = Metric("bot_updates_total", "Updates received, by type", "counter", ("type",))
+UPDATE_SECONDS = Metric("bot_update_seconds", "Full update processing time, middlewares included", "histogram")
+HANDLER_SECONDS = Metric("bot_handler_seconds", "Handler latency", "histogram", ("handler",))
+HANDLER_ERRORS = Metric("bot_handler_errors_total", "Handlers that raised", "counter", ("handler",))
+API_SECONDS = Metric("bot_api_seconds", "Bot API request latency, per attempt", "histogram", ("method",))
+CATALOG_LOAD_SECONDS = Metric(
+    "bot_catalog_load_seconds", "Catalog reads from storage (full or changed categories only)", "histogram", ("mode",)
+)
+CATALOG_SAVE_SECONDS = Metric("bot_catalog_save_seconds", "Catalog writes to storage", "histogram")
+CATALOG_SAVE_OPS = Metric(
+    "bot_catalog_save_ops", "Changes per catalog write (0 = full rewrite)", "histogram", buckets=COUNT_BUCKETS
+)
+CATALOG_SIZE = Metric("bot_catalog_size", "Objects in the current catalog snapshot", "gauge", ("kind",))
+SEARCH_SECONDS = Metric("bot_search_seconds", "Uncached searches, by result count", "histogram", ("results",))
+KEYBOARD_SECONDS = Metric("bot_keyboard_build_seconds", "Paged keyboard builds (cache misses)", "histogram", ("kind",))
+FSM_STATES = Metric("bot_fsm_states", "Conversations per FSM state", "gauge", ("state",))
+LOOP_LAG_SECONDS = Metric("bot_event_loop_lag_seconds", "Event loop wake-up delay", "histogram")
+
+def result_bucket(n: int) -> str:
+    if n == 0:
+        return "0"
+    if n <= 10:
+        return "1-10"
+    if n <= 100:
+        return "11-100"
+    return "100+"
+
+async def start_metrics_server(host: str, port: int):
+    # aiohttp приходит вместе с aiogram; импорт здесь, чтобы сами метрики работали и без него
+    from aiohttp import web
+
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    log.info("metrics on http://%s:%s/metrics", host, port)
+    return runner
+
+# насколько позже запланированного просыпается цикл событий — время, когда он был чем-то занят
+LOOP_LAG = LOOP_LAG_SECONDS.labels()
+
+async def monitor_event_loop(hist: Histogram = LOOP_LAG, interval: float = 0.1, report_every: float = 300.0) -> None:
+    loop = asyncio.get_running_loop()
+    last_report = loop.time()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        now = loop.time()
+        hist.observe(max(0.0, now - started - interval))
+        if now - last_report >= report_every:
+            log.info("event loop stall: %s", hist.summary())
+            last_report = now
@@ -0,0 +1,216 @@
+import argparse
+import json
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from .catalog import (
+    add_book_to_category, clear_search_cache, ensure_unique_book_id, get_book, get_category,
+    load_catalog, load_catalog_for_update, save_catalog, search_books, set_storage, slugify
+)
+from .storage import JsonStorage
+from .synthetic import make_book, make_catalog, sample_queries
+
+# Микробенчмарки примитивов каталога на синтетических каталогах разного размера:
+#   python -m src.microbench run --sizes 1000 20000 200000 --out bench-base.json
+#   python -m src.microbench compare bench-base.json bench-new.json --threshold 0.2
+# compare завершается с кодом 1, если медиана хоть одного замера выросла больше чем на threshold
+
+# сколько вызовов в одном замере у быстрых функций — иначе мерили бы perf_counter
+BATCH = 1000
+
+class Bench:
+    # fn(state) -> число операций за вызов; setup(state) готовит вызов и в замер не входит
+    def __init__(self, name: str, fn: Callable[[dict], int], setup: Callable[[dict], None] | None = None):
+        self.name = name
+        self.fn = fn
+        self.setup = setup
+
+BENCHES: list[Bench] = []
+
+def bench(name: str, setup: Callable[[dict], None] | None = None):
+    def register(fn: Callable[[dict], int]) -> Callable[[dict], int]:
+        BENCHES.append(Bench(name, fn, setup))
+        return fn
+    return register
+
+def _cold(state: dict) -> None:
+    # новое хранилище — новый пустой кэш, load_catalog читает файл с нуля
+    set_storage(JsonStorage(state["path"]))
+
+def _for_update(state: dict) -> None:
+    state["mutable"] = load_catalog_for_update()
+
+@bench("load_catalog_cold", setup=_cold)
+def bench_load_cold(state: dict) -> int:
+    load_catalog()
+    return 1
+
+@bench("load_catalog_warm")
+def bench_load_warm(state: dict) -> int:
+    for _ in range(BATCH):
+        load_catalog()
+    return BATCH
+
+@bench("save_catalog_one_book", setup=_for_update)
+def bench_save_one(state: dict) -> int:
+    catalog = state["mutable"]
+    book = make_book(state["rng"], state["rng"].randrange(10 ** 9))
+    book["id"] = ensure_unique_book_id(catalog, book["id"])
+    add_book_to_category(catalog, catalog["categories"][0]["id"], book)
+    save_catalog(catalog)
+    return 1
+
+@bench("save_catalog_full")
+def bench_save_full(state: dict) -> int:
+    # обычный dict без журнала изменений — полная перезапись снимка
+    save_catalog(state["plain"])
+    return 1
+
+@bench("get_book")
+def bench_get_book(state: dict) -> int:
+    catalog = load_catalog()
+    for book_id in state["book_ids"]:
+        get_book(catalog, book_id)
+    return len(state["book_ids"])
+
+@bench("get_category")
+def bench_get_category(state: dict) -> int:
+    catalog = load_catalog()
+    for cat_id in state["cat_ids"]:
+        get_category(catalog, cat_id)
+    return len(state["cat_ids"])
+
+@bench("search_books_uncached", setup=lambda state: clear_search_cache())
+def bench_search_uncached(state: dict) -> int:
+    catalog = load_catalog()
+    for q in state["queries"][:20]:
+        search_books(catalog, q, limit=10)
+    return 20
+
+@bench("search_books_cached")
+def bench_search_cached(state: dict) -> int:
+    catalog = load_catalog()
+    for q in state["queries"][:20]:
+        search_books(catalog, q, limit=10)
+    return 20
+
+@bench("slugify")
+def bench_slugify(state: dict) -> int:
+    for title in state["titles"]:
+        slugify(title)
+    return len(state["titles"])
+
+@bench("ensure_unique_book_id", setup=_for_update)
+def bench_unique_id(state: dict) -> int:
+    # базовые id заведомо заняты — худший случай с суффиксами
+    catalog = state["mutable"]
+    for book_id in state["book_ids"]:
+        ensure_unique_book_id(catalog, book_id)
+    return len(state["book_ids"])
+
+def measure(b: Bench, state: dict, repeat: int) -> dict[str, float]:
+    if b.setup is None:
+        # прогрев: кэши и индексы строятся до замера
+        b.fn(state)
+    per_op = []
+    for _ in range(repeat):
+        if b.setup is not None:
+            b.setup(state)
+        started = time.perf_counter()
+        ops = b.fn(state)
+        per_op.append((time.perf_counter() - started) / ops)
+    return {
+        "median_us": round(statistics.median(per_op) * 1e6, 3),
+        "min_us": round(min(per_op) * 1e6, 3),
+        "repeat": repeat,
+    }
+
+def run(sizes: list[int], repeat: int, only: set[str] | None, seed: int) -> dict[str, Any]:
+    results = {}
+    for size in sizes:
+        workdir = Path(tempfile.mkdtemp(prefix="microbench-"))
+        try:
+            catalog = make_catalog(size, seed=seed)
+            path = workdir / "catalog.json"
+            path.write_text(json.dumps(catalog, ensure_ascii=False), encoding="utf-8")
+            rng = random.Random(seed)
+            books = [b for c in catalog["categories"] for b in c["books"]]
+            state = {
+                "path": path,
+                "rng": rng,
+                "plain": catalog,
+                "book_ids": [rng.choice(books)["id"] for _ in range(BATCH)],
+                "cat_ids": [rng.choice(catalog["categories"])["id"] for _ in range(BATCH)],
+                "titles": [rng.choice(books)["title"] for _ in range(BATCH)],
+                "queries": sample_queries(catalog, 100, seed),
+            }
+            for b in BENCHES:
+                if only and b.name not in only:
+                    continue
+                _cold(state)
+                # медленные замеры на больших каталогах повторяем реже
+                n = max(3, repeat // 5) if b.name.startswith(("load_catalog_cold", "save_")) else repeat
+                results[f"{b.name}[{size}]"] = measure(b, state, n)
+                print(f"{b.name}[{size}]: {results[f'{b.name}[{size}]']['median_us']} мкс", flush=True)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+def compare(base: dict[str, Any], new: dict[str, Any], threshold: float) -> list[str]:
+    regressions = []
+    for name, old in sorted(base["results"].items()):
+        cur = new["results"].get(name)
+        if cur is None or not old["median_us"]:
+            continue
+        ratio = cur["median_us"] / old["median_us"]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = "  <-- регрессия"
+            regressions.append(name)
+        print(f"{name:40} {old['median_us']:>12.3f} -> {cur['median_us']:>12.3f} мкс  x{ratio:.2f}{mark}")
+    return regressions
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Микробенчмарки функций каталога")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_run = sub.add_parser("run")
+    p_run.add_argument("--sizes", type=int, nargs="+", default=[1_000, 20_000])
+    p_run.add_argument("--repeat", type=int, default=20)
+    p_run.add_argument("--only", nargs="*", help="имена бенчмарков, по умолчанию все")
+    p_run.add_argument("--seed", type=int, default=1)
+    p_run.add_argument("--out", type=Path)
+    p_cmp = sub.add_parser("compare")
+    p_cmp.add_argument("base", type=Path)
+    p_cmp.add_argument("new", type=Path)
+    p_cmp.add_argument("--threshold", type=float, default=0.2)
+    args = parser.parse_args()
+
+    if args.command == "run":
+        report = run(args.sizes, args.repeat, set(args.only) if args.only else None, args.seed)
+        if args.out:
+            args.out.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        return
+    base = json.loads(args.base.read_text(encoding="utf-8"))
+    new = json.loads(args.new.read_text(encoding="utf-8"))
+    regressions = compare(base, new, args.threshold)
+    if regressions:
+        print(f"Регрессий: {len(regressions)} (порог +{args.threshold:.0%})")
+        sys.exit(1)
+    print("Регрессий нет")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from typing import Any, Awaitable, Callable
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import (
+    AnswerCallbackQuery, AnswerInlineQuery, DeleteWebhook, GetUpdates, SetWebhook, TelegramMethod
+)
+from aiogram.methods.base import Response, TelegramType
+from aiogram.types import TelegramObject, Update
+
+from .metrics import API_SECONDS, HANDLER_ERRORS, HANDLER_SECONDS, UPDATE_SECONDS, UPDATES
+from .ratelimit import OutboundLimiter, UserRateLimiter
+from .states import AdminBulkFlow, SearchFlow
+
+class ConcurrencyLimitMiddleware(BaseMiddleware):
+    # не больше limit апдейтов в обработке одновременно — остальные ждут своей очереди
+    def __init__(self, limit: int):
+        self._sem = asyncio.Semaphore(max(1, limit))
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        async with self._sem:
+            return await handler(event, data)
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    # внешний на dp.update: поток апдейтов и полное время обработки, с ожиданием в очереди
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        UPDATES.labels(type=getattr(event, "event_type", "unknown")).inc()
+        with UPDATE_SECONDS.labels().time():
+            return await handler(event, data)
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    # внутренний (на message / callback_query / inline_query): к этому моменту хендлер уже выбран
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        handler_object = data.get("handler")
+        name = getattr(getattr(handler_object, "callback", None), "__name__", "unknown")
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        except Exception:
+            HANDLER_ERRORS.labels(handler=name).inc()
+            raise
+        finally:
+            HANDLER_SECONDS.labels(handler=name).observe(time.perf_counter() - started)
+
+def classify_update(update: Update, raw_state: str | None) -> tuple[int | None, str | None]:
+    if update.callback_query:
+        c = update.callback_query
+        if c.data and c.data.startswith("dl:"):
+            return c.from_user.id, "download"
+        if c.data and c.data.startswith("sr:"):
+            return c.from_user.id, "search"
+        return c.from_user.id, "navigation"
+    if update.inline_query:
+        return update.inline_query.from_user.id, "inline"
+    if update.message and update.message.from_user:
+        if raw_state == AdminBulkFlow.collecting.state:
+            # админ пересылает пачку файлов — лимит навигации тут ни к чему
+            return None, None
+        if raw_state == SearchFlow.waiting_query.state:
+            return update.message.from_user.id, "search"
+        return update.message.from_user.id, "navigation"
+    return None, None
+
+# о пропущенном сообщении напоминаем не чаще раза в столько секунд, иначе само напоминание станет флудом
+LIMIT_NOTICE_INTERVAL = 10.0
+
+def limit_notice(wait: float) -> str:
+    return f"Слишком часто. Подождите {max(1, math.ceil(wait))} с."
+
+class RateLimitMiddleware(BaseMiddleware):
+    # вешается на dp.update после FSM-мидлвари, чтобы видеть состояние пользователя
+    def __init__(self, limiter: UserRateLimiter):
+        self.limiter = limiter
+        self.notices = UserRateLimiter({"notice": (1 / LIMIT_NOTICE_INTERVAL, 1)})
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: dict[str, Any],
+    ) -> Any:
+        user_id, action = classify_update(event, data.get("raw_state"))
+        if user_id is None:
+            return await handler(event, data)
+        wait = self.limiter.check(user_id, action)
+        if not wait:
+            return await handler(event, data)
+        if event.callback_query:
+            # на кнопку обязательно отвечаем, иначе у пользователя «висят часики»
+            await event.callback_query.answer(limit_notice(wait))
+        elif event.inline_query:
+            # пустой ответ только этому пользователю и ненадолго: следующая буква запроса придёт уже с жетоном
+            await event.inline_query.answer([], cache_time=1, is_personal=True)
+        elif event.message and not self.notices.check(user_id, "notice"):
+            await event.message.answer(limit_notice(wait))
+        return None
+
+class OutboundRateMiddleware(BaseRequestMiddleware):
+    # ответы на кнопки и служебные вызовы не ждут общего лимита
+    UNTHROTTLED = (GetUpdates, AnswerCallbackQuery, AnswerInlineQuery, SetWebhook, DeleteWebhook)
+
+    def __init__(self, limiter: OutboundLimiter, max_retries: int = 3):
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, self.UNTHROTTLED):
+            return await make_request(bot, method)
+        attempt = 0
+        while True:
+            await self.limiter.acquire()
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                # 429: Telegram сам говорит, сколько ждать — ставим на паузу всю отправку
+                self.limiter.pause(e.retry_after)
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise
+
+class ApiMetricsMiddleware(BaseRequestMiddleware):
+    # ставится после OutboundRateMiddleware: меряем сам запрос, без ожидания лимита; getUpdates — долгий опрос
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        if isinstance(method, GetUpdates):
+            return await make_request(bot, method)
+        with API_SECONDS.labels(method=type(method).__name__).time():
+            return await make_request(bot, method)
@@ -0,0 +1,36 @@
+import argparse
+from pathlib import Path
+
+from .catalog import CATALOG_PATH
+from .storage import export_json, migrate_json_to_binary, migrate_json_to_sqlite, open_storage
+
+# Разовый перенос data/catalog.json в SQLite или бинарный снимок:
+#   python -m src.migrate [--json data/catalog.json] [--db data/catalog.sqlite3]
+#   python -m src.migrate --to binary [--db data/catalog.bin]
+# После переноса поставьте CATALOG_BACKEND=sqlite (или binary) в .env
+# Читаемый JSON с отступами из любого хранилища:
+#   python -m src.migrate --export data/catalog.export.json --from binary [--db data/catalog.bin]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Перенос каталога между хранилищами и выгрузка в JSON")
+    parser.add_argument("--json", type=Path, default=CATALOG_PATH)
+    parser.add_argument("--db", type=Path, default=None, help="база SQLite или бинарный снимок")
+    parser.add_argument("--to", choices=("sqlite", "binary"), default="sqlite")
+    parser.add_argument("--export", type=Path, default=None, help="выгрузить каталог в читаемый JSON")
+    parser.add_argument("--from", dest="source", choices=("json", "sqlite", "binary"), default="json")
+    args = parser.parse_args()
+
+    if args.export:
+        cats, books = export_json(open_storage(args.source, args.json, args.db), args.export)
+        print(f"Готово: {cats} категорий, {books} книг -> {args.export}")
+        return
+    if args.to == "binary":
+        db = args.db or args.json.with_suffix(".bin")
+        cats, books = migrate_json_to_binary(args.json, db)
+    else:
+        db = args.db or args.json.with_suffix(".sqlite3")
+        cats, books = migrate_json_to_sqlite(args.json, db)
+    print(f"Готово: {cats} категорий, {books} книг -> {db}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+import logging
+import random
+from collections import OrderedDict
+from typing import Any
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError, TelegramServerError
+from aiogram.methods import (
+    AnswerCallbackQuery, AnswerInlineQuery, EditMessageReplyMarkup, EditMessageText, SendDocument, TelegramMethod
+)
+
+log = logging.getLogger(__name__)
+
+# меньше — раньше: сначала гасим «часики» на кнопках, документы — в последнюю очередь
+PRIORITY_ANSWER = 0
+PRIORITY_TEXT = 1
+PRIORITY_DOCUMENT = 2
+
+def method_priority(method: TelegramMethod) -> int:
+    if isinstance(method, (AnswerCallbackQuery, AnswerInlineQuery)):
+        return PRIORITY_ANSWER
+    if isinstance(method, SendDocument):
+        return PRIORITY_DOCUMENT
+    return PRIORITY_TEXT
+
+def _edit_key(method: TelegramMethod) -> tuple[Any, Any] | None:
+    if isinstance(method, (EditMessageText, EditMessageReplyMarkup)) and method.message_id is not None:
+        return method.chat_id, method.message_id
+    return None
+
+def _edit_content(method: TelegramMethod) -> tuple[Any, Any]:
+    return getattr(method, "text", None), method.reply_markup
+
+class _Job:
+    __slots__ = ("method", "future", "key")
+
+    def __init__(self, method: TelegramMethod, future: asyncio.Future, key: tuple[Any, Any] | None):
+        self.method = method
+        self.future = future
+        self.key = key
+
+class Outbox:
+    # хендлер кладёт вызов Bot API в очередь и сразу возвращается; отправляют фоновые воркеры
+    def __init__(
+        self, bot: Bot, workers: int = 4, max_retries: int = 4, base_delay: float = 0.5, dedup_edits: bool = True
+    ):
+        self.bot = bot
+        self.workers = max(1, workers)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self._queue: asyncio.PriorityQueue[tuple[int, int, _Job]] = asyncio.PriorityQueue()
+        self._seq = itertools.count()
+        self._tasks: list[asyncio.Task] = []
+        # ещё не отправленная правка сообщения: новая правка того же сообщения заменяет её
+        self._pending_edits: dict[tuple[Any, Any], _Job] = {}
+        # что последним ушло в каждое сообщение — одинаковую правку не отправляем. Только для одного процесса:
+        # при нескольких воркерах сообщение мог поменять другой процесс, и сравнивать не с чем
+        self.dedup_edits = dedup_edits
+        self._last_edit: OrderedDict[tuple[Any, Any], tuple[Any, Any]] = OrderedDict()
+        self.max_tracked_edits = 10_000
+        self.sent = 0
+        self.skipped = 0
+        self.failed = 0
+        self.retries = 0
+
+    def _ensure_workers(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def put(self, method: TelegramMethod, priority: int | None = None) -> asyncio.Future:
+        self._ensure_workers()
+        future = asyncio.get_running_loop().create_future()
+        key = _edit_key(method)
+        if key is not None:
+            queued = self._pending_edits.get(key)
+            if queued is not None:
+                # предыдущая правка ещё в очереди — отправим сразу последнюю версию,
+                # даже если она совпадает с уже показанной: очередная правка её бы заменила
+                queued.method = method
+                self.skipped += 1
+                future.set_result(None)
+                return future
+            if self.dedup_edits and self._last_edit.get(key) == _edit_content(method):
+                self.skipped += 1
+                future.set_result(None)
+                return future
+        job = _Job(method, future, key)
+        if key is not None:
+            self._pending_edits[key] = job
+        self._queue.put_nowait((method_priority(method) if priority is None else priority, next(self._seq), job))
+        return future
+
+    async def _call(self, method: TelegramMethod) -> Any:
+        attempt = 0
+        while True:
+            try:
+                return await self.bot(method)
+            except TelegramBadRequest as e:
+                if "message is not modified" in str(e):
+                    return None
+                raise
+            except (TelegramNetworkError, TelegramServerError):
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                await asyncio.sleep(self.base_delay * 2 ** attempt * (1 + random.random() / 2))
+                attempt += 1
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+            if job.key is not None:
+                self._pending_edits.pop(job.key, None)
+                # пока правка в пути, показанное сообщение неизвестно — следующую правку не отбрасываем
+                self._last_edit.pop(job.key, None)
+            method = job.method
+            try:
+                result = await self._call(method)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.failed += 1
+                log.warning("outbox: %s failed: %r", type(method).__name__, e)
+                if not job.future.done():
+                    job.future.set_exception(e)
+                    # никто может и не ждать этот future — не даём asyncio ругаться
+                    job.future.exception()
+            else:
+                self.sent += 1
+                if job.key is not None and self.dedup_edits:
+                    self._last_edit[job.key] = _edit_content(method)
+                    self._last_edit.move_to_end(job.key)
+                    while len(self._last_edit) > self.max_tracked_edits:
+                        self._last_edit.popitem(last=False)
+                if not job.future.done():
+                    job.future.set_result(result)
+            finally:
+                self._queue.task_done()
+
+    async def close(self, **kwargs: Any) -> None:
+        # дожидаемся очереди и гасим воркеры; подходит как обработчик dp.shutdown
+        if self._tasks:
+            await self._queue.join()
+        for t in self._tasks:
+            t.cancel()
+        self._tasks = []
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "sent": self.sent,
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "retries": self.retries,
+        }
@@ -0,0 +1,115 @@
+import asyncio
+import time
+from collections import OrderedDict
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def try_take(self, now: float | None = None) -> float:
+        # 0 — жетон взят; иначе сколько секунд ждать следующего
+        self._refill(time.monotonic() if now is None else now)
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+# действие -> (жетонов в секунду, запас); запас — сколько можно сделать подряд
+DEFAULT_USER_LIMITS = {
+    "search": (0.5, 5),
+    # Telegram шлёт inline-запрос на каждое нажатие клавиши — запас на набор целого запроса
+    "inline": (2.0, 20),
+    "download": (0.2, 3),
+    "navigation": (3.0, 15),
+}
+
+def split_limits(limits: dict[str, tuple[float, float]], parts: int) -> dict[str, tuple[float, float]]:
+    # доля одного из parts процессов: апдейты расходятся по ним примерно поровну, в сумме выходит исходный лимит.
+    # Запас не меньше 1 — иначе корзина не пропустит ничего
+    return {action: (rate / parts, max(1.0, capacity / parts)) for action, (rate, capacity) in limits.items()}
+
+class UserRateLimiter:
+    # корзины по (пользователь, действие); давно не трогавшиеся вытесняются
+    def __init__(self, limits: dict[str, tuple[float, float]] = DEFAULT_USER_LIMITS, max_buckets: int = 100_000):
+        self.limits = dict(limits)
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[tuple[int, str], TokenBucket] = OrderedDict()
+        self.allowed = {action: 0 for action in self.limits}
+        self.limited = {action: 0 for action in self.limits}
+
+    def set_limits(self, limits: dict[str, tuple[float, float]]) -> None:
+        self.limits = dict(limits)
+        self._buckets.clear()
+        for action in self.limits:
+            self.allowed.setdefault(action, 0)
+            self.limited.setdefault(action, 0)
+
+    def check(self, user_id: int, action: str) -> float:
+        if action not in self.limits:
+            return 0.0
+        key = (user_id, action)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*self.limits[action])
+            if len(self._buckets) > self.max_buckets:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        wait = bucket.try_take()
+        if wait:
+            self.limited[action] += 1
+        else:
+            self.allowed[action] += 1
+        return wait
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        return {"allowed": dict(self.allowed), "limited": dict(self.limited), "buckets": len(self._buckets)}
+
+class OutboundLimiter:
+    # общий темп исходящих запросов к Bot API (Telegram разрешает ~30 сообщений в секунду).
+    # Корзина живёт в процессе: при нескольких воркерах каждому достаётся своя доля темпа
+    def __init__(self, rate: float = 30.0):
+        self.bucket = TokenBucket(rate, rate)
+        self._lock = asyncio.Lock()
+        # после 429 вся отправка ждёт до этого момента
+        self.paused_until = 0.0
+        self.sent = 0
+        self.delayed = 0
+        self.retry_after = 0
+
+    def set_rate(self, rate: float) -> None:
+        self.bucket = TokenBucket(rate, rate)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self.delayed += 1
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                wait = self.bucket.try_take(now)
+                if not wait:
+                    break
+                self.delayed += 1
+                await asyncio.sleep(wait)
+        self.sent += 1
+
+    def pause(self, seconds: float) -> None:
+        self.retry_after += 1
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    def stats(self) -> dict[str, int]:
+        return {"sent": self.sent, "delayed": self.delayed, "retry_after": self.retry_after}
+
+USER_LIMITS = UserRateLimiter()
+OUTBOUND = OutboundLimiter()
@@ -0,0 +1,120 @@
+import sys
+from collections.abc import Mapping
+from typing import Any
+
+# Неизменяемые записи снапшота каталога. Отдельно от catalog.py, потому что готовые записи
+# собирает и хранилище (бинарный снимок с описаниями в отображённом в память файле)
+
+class FrozenDict(dict):
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("catalog snapshot is read-only, use load_catalog_for_update()")
+
+    __setitem__ = __delitem__ = __ior__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+
+def freeze(obj: Any) -> Any:
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+_MISSING: Any = object()
+
+# поля книги, под которые в Book заведены слоты; редкие прочие ключи уходят в _extra
+_BOOK_SLOTS = {
+    "id": "id", "title": "title", "author": "author", "description": "_description", "format": "format",
+    "file_id": "file_id", "file_name": "file_name", "file_unique_id": "file_unique_id",
+    "sha256": "sha256", "size": "size",
+}
+# значения из небольшого набора: одна строка на весь каталог вместо копии в каждой книге
+_INTERNED = frozenset(("author", "format"))
+
+class Book(Mapping):
+    # книга в снапшоте: объект со слотами вместо dict на каждую книгу, снаружи — тот же read-only Mapping.
+    # Описание — обычная строка: кириллица в str и в UTF-8 одинаково занимает 2 байта на символ,
+    # а bytes пришлось бы декодировать при каждом чтении, в том числе на каждой пересборке индекса.
+    # Если задан blob (буфер снимка), в _description лежит не текст, а (начало << 32) | длина в этом буфере
+    __slots__ = tuple(_BOOK_SLOTS.values()) + ("_extra", "_blob")
+
+    def __init__(self, data: Mapping[str, Any], blob: Any = None, span: int = 0):
+        extra = None
+        for key, value in data.items():
+            slot = _BOOK_SLOTS.get(key)
+            if slot is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = freeze(value)
+            elif type(value) is str and key in _INTERNED:
+                setattr(self, slot, sys.intern(value))
+            else:
+                setattr(self, slot, value)
+        if extra is not None:
+            self._extra = FrozenDict(extra)
+        if blob is not None:
+            self._blob = blob
+            self._description = span
+
+    def get(self, key: str, default: Any = None) -> Any:
+        slot = _BOOK_SLOTS.get(key)
+        if slot is None:
+            return getattr(self, "_extra", {}).get(key, default)
+        value = getattr(self, slot, _MISSING)
+        if value is _MISSING:
+            return default
+        if slot != "_description":
+            return value
+        blob = getattr(self, "_blob", None)
+        if blob is not None:
+            start = value >> 32
+            return str(blob[start:start + (value & 0xFFFFFFFF)], "utf-8")
+        return value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key: object) -> bool:
+        slot = _BOOK_SLOTS.get(key) if isinstance(key, str) else None
+        if slot is None:
+            return key in getattr(self, "_extra", {})
+        return hasattr(self, slot)
+
+    def __iter__(self):
+        for key, slot in _BOOK_SLOTS.items():
+            if hasattr(self, slot):
+                yield key
+        yield from getattr(self, "_extra", {})
+
+    def __len__(self) -> int:
+        return sum(1 for _ in self)
+
+    def __repr__(self) -> str:
+        return f"Book({dict(self)!r})"
+
+    __setitem__ = __delitem__ = FrozenDict._readonly
+
+class BookHit(Mapping):
+    # строка выдачи search_books: книга и название её категории без копирования полей книги
+    __slots__ = ("book", "category_title")
+
+    def __init__(self, book: Mapping[str, Any], category_title: str):
+        self.book = book
+        self.category_title = category_title
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.category_title if key == "_category_title" else self.book.get(key, default)
+
+    def __getitem__(self, key: str) -> Any:
+        return self.category_title if key == "_category_title" else self.book[key]
+
+    def __iter__(self):
+        yield from self.book
+        yield "_category_title"
+
+    def __len__(self) -> int:
+        return len(self.book) + 1
@@ -1,5 +1,50 @@
+from functools import lru_cache
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from .metrics import KEYBOARD_SECONDS
+
+PAGE_SIZE = 10
+# карточек книг в кэше разметки; главное меню — всего два варианта
+BOOK_ACTIONS_CACHE_SIZE = 1024
+
+# готовые страницы клавиатур: ("cats", "", 0) / ("cat", cat_id, 2) -> (версия, разметка).
+# Страницы категории помечены версией самой категории: новая книга в одной категории не сбрасывает остальные
+_pages: dict[tuple[str, str, int], tuple[int, InlineKeyboardMarkup]] = {}
+
+def _cached_page(version: int | None, key: tuple[str, str, int], build) -> InlineKeyboardMarkup:
+    if version is None:
+        return build()
+    cached = _pages.get(key)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+    if cached is not None and cached[0] > version:
+        # запрос пришёл со старым снапшотом — строим без кэша, чтобы не смешивать версии
+        return build()
+    with KEYBOARD_SECONDS.labels(kind=key[0]).time():
+        markup = build()
+    _pages[key] = (version, markup)
+    return markup
+
+def page_count(total: int) -> int:
+    return max(1, (total + PAGE_SIZE - 1) // PAGE_SIZE)
+
+def clamp_page(page: int, total: int) -> int:
+    return min(max(page, 0), page_count(total) - 1)
+
+def _nav_row(prefix: str, page: int, total: int) -> list[InlineKeyboardButton]:
+    pages = page_count(total)
+    if pages == 1:
+        return []
+    row = []
+    if page > 0:
+        row.append(InlineKeyboardButton(text="◀️", callback_data=f"{prefix}:p{page - 1}"))
+    row.append(InlineKeyboardButton(text=f"{page + 1}/{pages}", callback_data="noop"))
+    if page < pages - 1:
+        row.append(InlineKeyboardButton(text="▶️", callback_data=f"{prefix}:p{page + 1}"))
+    return row
+
+# разметка не меняется после создания, поэтому одни и те же объекты отдаём всем хендлерам
+@lru_cache(maxsize=2)
 def kb_main(is_admin: bool) -> InlineKeyboardMarkup:
     rows = [
         [InlineKeyboardButton(text="Категории", callback_data="cats")],
@@ -9,16 +54,48 @@ def kb_main(is_admin: bool) -> InlineKeyboardMarkup:
         rows.append([InlineKeyboardButton(text="➕ Добавить книгу (админ)", callback_data="admin:add_help")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-def kb_categories(categories: list[dict]) -> InlineKeyboardMarkup:
-    rows = [[InlineKeyboardButton(text=c["title"], callback_data=f"cat:{c['id']}")] for c in categories]
-    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="home")])
-    return InlineKeyboardMarkup(inline_keyboard=rows)
+def kb_categories(categories: list[dict], page: int = 0, version: int | None = None) -> InlineKeyboardMarkup:
+    page = clamp_page(page, len(categories))
+
+    def build() -> InlineKeyboardMarkup:
+        chunk = categories[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        rows = [[InlineKeyboardButton(text=c["title"], callback_data=f"cat:{c['id']}")] for c in chunk]
+        nav = _nav_row("cats", page, len(categories))
+        if nav:
+            rows.append(nav)
+        rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="home")])
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    return _cached_page(version, ("cats", "", page), build)
 
-def kb_books(books: list[dict]) -> InlineKeyboardMarkup:
-    rows = [[InlineKeyboardButton(text=b["title"], callback_data=f"book:{b['id']}")] for b in books]
-    rows.append([InlineKeyboardButton(text="⬅️ Категории", callback_data="cats")])
+def kb_books(cat_id: str, books: list[dict], page: int = 0, version: int | None = None) -> InlineKeyboardMarkup:
+    page = clamp_page(page, len(books))
+
+    def build() -> InlineKeyboardMarkup:
+        chunk = books[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]
+        rows = [[InlineKeyboardButton(text=b["title"], callback_data=f"book:{b['id']}")] for b in chunk]
+        nav = _nav_row(f"cat:{cat_id}", page, len(books))
+        if nav:
+            rows.append(nav)
+        rows.append([InlineKeyboardButton(text="⬅️ Категории", callback_data="cats")])
+        return InlineKeyboardMarkup(inline_keyboard=rows)
+
+    return _cached_page(version, ("cat", cat_id, page), build)
+
+def kb_search_results(books: list[dict], page: int, total: int) -> InlineKeyboardMarkup:
+    # books — уже вырезанная страница выдачи, total — длина всей выдачи
+    rows = []
+    for b in books:
+        text = f"{b['title']} — {b['author']}" if b.get("author") else b["title"]
+        rows.append([InlineKeyboardButton(text=text, callback_data=f"book:{b['id']}")])
+    nav = _nav_row("sr", page, total)
+    if nav:
+        rows.append(nav)
+    rows.append([InlineKeyboardButton(text="🔎 Новый поиск", callback_data="search:ask")])
+    rows.append([InlineKeyboardButton(text="⬅️ Назад", callback_data="home")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
+@lru_cache(maxsize=BOOK_ACTIONS_CACHE_SIZE)
 def kb_book_actions(book_id: str) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="📥 Скачать", callback_data=f"dl:{book_id}")],
@@ -30,3 +107,17 @@ def kb_admin_add_category(cats: list[dict]) -> InlineKeyboardMarkup:
     rows.append([InlineKeyboardButton(text="➕ Новая категория", callback_data="admin:new_cat")])
     rows.append([InlineKeyboardButton(text="❌ Отмена", callback_data="admin:cancel")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
+
+def kb_admin_confirm_meta() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="✅ Сохранить", callback_data="admin:meta_ok")],
+        [InlineKeyboardButton(text="✏️ Ввести вручную", callback_data="admin:meta_edit")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="admin:cancel")],
+    ])
+
+def kb_admin_duplicate() -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🔗 Использовать существующую", callback_data="admin:dup_link")],
+        [InlineKeyboardButton(text="➕ Всё равно добавить", callback_data="admin:dup_new")],
+        [InlineKeyboardButton(text="❌ Отмена", callback_data="admin:cancel")],
+    ])
@@ -1,23 +1,105 @@
 import asyncio
-from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
+import logging
+from pathlib import Path
+from aiogram import BaseMiddleware, Bot, Dispatcher
 
-from .config import load_config
+from .config import Config, load_config
+from .catalog import CATALOG_PATH, set_storage, set_io_workers, enable_multiprocess
+from .fsm_storage import fsm_state_counts, make_fsm_storage
+from .metrics import COLLECTORS, FSM_STATES, monitor_event_loop, start_metrics_server
+from .middlewares import (
+    ApiMetricsMiddleware, ConcurrencyLimitMiddleware, HandlerMetricsMiddleware, OutboundRateMiddleware,
+    RateLimitMiddleware, UpdateMetricsMiddleware
+)
+from .outbox import Outbox
+from .ratelimit import DEFAULT_USER_LIMITS, OUTBOUND, USER_LIMITS, split_limits
+from .storage import open_storage
 from .handlers_public import router as public_router
 from .handlers_admin import router as admin_router
+from .handlers_inline import router as inline_router
+from .webhook import run_webhook
+from .workers import run_workers
 
-async def main():
+async def main(worker_index: int = 0):
+    logging.basicConfig(level=logging.INFO)
     cfg = load_config()
+    db_path = Path(cfg.catalog_db_path) if cfg.catalog_db_path else None
+    set_storage(open_storage(cfg.catalog_backend, CATALOG_PATH, db_path))
+    set_io_workers(cfg.catalog_io_workers, cfg.catalog_search_workers)
+    if cfg.workers > 1:
+        enable_multiprocess()
+
     bot = Bot(token=cfg.bot_token)
-    dp = Dispatcher(storage=MemoryStorage())
+    dp = build_dispatcher(cfg, bot)
+
+    # задержки цикла событий видны в логах и в /stats
+    lag_monitor = asyncio.create_task(monitor_event_loop())
+    metrics_runner = None
+    if cfg.metrics_port:
+        metrics_runner = await start_metrics_server(cfg.metrics_host, cfg.metrics_port + worker_index)
+    try:
+        if cfg.run_mode == "webhook":
+            await run_webhook(bot, dp, cfg, register=worker_index == 0)
+        else:
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        lag_monitor.cancel()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+def build_dispatcher(cfg: Config, bot: Bot, outer: tuple[BaseMiddleware, ...] = ()) -> Dispatcher:
+    # роутеры — синглтоны модулей, поэтому диспетчер на процесс можно собрать только один раз
+    # лимиты считаются в каждом процессе отдельно — делим их между воркерами, чтобы в сумме не превысить
+    OUTBOUND.set_rate(cfg.outbound_rate / cfg.workers)
+    USER_LIMITS.set_limits(split_limits(DEFAULT_USER_LIMITS, cfg.workers))
+    bot.session.middleware(OutboundRateMiddleware(OUTBOUND))
+    bot.session.middleware(ApiMetricsMiddleware())
+    dp = Dispatcher(storage=make_fsm_storage(cfg))
 
     # передаём admin_ids в хендлеры как зависимость
     dp["admin_ids"] = cfg.admin_ids
+    dp["inline_cache_time"] = cfg.inline_cache_time
+    dp["workers"] = cfg.workers
+    # ответы публичных хендлеров уходят через очередь; при остановке дожидаемся её.
+    # Сверка с последней правкой сообщения верна только для одного процесса
+    outbox = Outbox(bot, dedup_edits=cfg.workers <= 1)
+    dp["outbox"] = outbox
+    dp.shutdown.register(outbox.close)
+    # outer — самые внешние: видят каждый апдейт, в том числе отброшенные лимитами, и ожидание в очереди
+    for middleware in outer:
+        dp.update.outer_middleware(middleware)
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    if cfg.user_rate_limits:
+        dp.update.outer_middleware(RateLimitMiddleware(USER_LIMITS))
+    dp.update.outer_middleware(ConcurrencyLimitMiddleware(cfg.max_concurrent_updates))
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(HandlerMetricsMiddleware())
+
+    def collect_fsm_states() -> None:
+        counts = fsm_state_counts(dp.storage)
+        if counts is not None:
+            FSM_STATES.clear()
+            for state, n in counts.items():
+                FSM_STATES.labels(state=state).set(n)
+
+    COLLECTORS.append(collect_fsm_states)
 
     dp.include_router(public_router)
     dp.include_router(admin_router)
+    dp.include_router(inline_router)
+    return dp
+
+def run_worker(worker_index: int) -> None:
+    asyncio.run(main(worker_index))
 
-    await dp.start_polling(bot)
+def run() -> None:
+    cfg = load_config()
+    if cfg.workers > 1:
+        logging.basicConfig(level=logging.INFO)
+        run_workers(cfg, run_worker)
+    else:
+        asyncio.run(main())
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    run()
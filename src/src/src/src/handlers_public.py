@@ -1,9 +1,12 @@
 from aiogram import Router, F
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup
 from aiogram.fsm.context import FSMContext
 
-from .catalog import load_catalog, get_category, get_book, search_books
-from .keyboards import kb_main, kb_categories, kb_books, kb_book_actions
+from .catalog import aload_catalog, get_category, get_book, aranked_book_ids, category_version
+from .keyboards import (
+    PAGE_SIZE, kb_main, kb_categories, kb_books, kb_book_actions, kb_search_results, clamp_page
+)
+from .outbox import Outbox
 from .states import SearchFlow
 
 router = Router()
@@ -11,63 +14,75 @@ router = Router()
 def is_admin(user_id: int, admin_ids: set[int]) -> bool:
     return user_id in admin_ids
 
+def parse_page(part: str) -> int:
+    # "p3" -> 3; всё непонятное — первая страница
+    return int(part[1:]) if part.startswith("p") and part[1:].isdigit() else 0
+
 @router.message(F.text.in_({"/start", "/help"}))
-async def cmd_start(m: Message, state: FSMContext, admin_ids: set[int]):
+async def cmd_start(m: Message, state: FSMContext, admin_ids: set[int], outbox: Outbox):
     await state.clear()
-    await m.answer(
+    outbox.put(m.answer(
         "Ассаляму алейкум.\nЭто библиотека книг.\nВыберите действие:",
         reply_markup=kb_main(is_admin(m.from_user.id, admin_ids))
-    )
+    ))
 
 @router.callback_query(F.data == "home")
-async def cb_home(c: CallbackQuery, state: FSMContext, admin_ids: set[int]):
+async def cb_home(c: CallbackQuery, state: FSMContext, admin_ids: set[int], outbox: Outbox):
     await state.clear()
-    await c.message.edit_text(
+    outbox.put(c.message.edit_text(
         "Выберите действие:",
         reply_markup=kb_main(is_admin(c.from_user.id, admin_ids))
-    )
-    await c.answer()
+    ))
+    outbox.put(c.answer())
 
-@router.callback_query(F.data == "cats")
-async def cb_categories(c: CallbackQuery, admin_ids: set[int]):
-    catalog = load_catalog()
+@router.callback_query(F.data == "noop")
+async def cb_noop(c: CallbackQuery, outbox: Outbox):
+    outbox.put(c.answer())
+
+@router.callback_query((F.data == "cats") | F.data.startswith("cats:"))
+async def cb_categories(c: CallbackQuery, admin_ids: set[int], outbox: Outbox):
+    page = parse_page(c.data.split(":", 1)[1]) if ":" in c.data else 0
+    catalog = await aload_catalog()
     cats = catalog.get("categories", [])
     if not cats:
-        await c.message.edit_text(
+        outbox.put(c.message.edit_text(
             "Пока нет категорий. Админ может добавить книги.",
             reply_markup=kb_main(is_admin(c.from_user.id, admin_ids))
-        )
-        await c.answer()
+        ))
+        outbox.put(c.answer())
         return
-    await c.message.edit_text("Категории:", reply_markup=kb_categories(cats))
-    await c.answer()
+    outbox.put(c.message.edit_text("Категории:", reply_markup=kb_categories(cats, page, catalog.version)))
+    outbox.put(c.answer())
 
 @router.callback_query(F.data.startswith("cat:"))
-async def cb_cat(c: CallbackQuery, admin_ids: set[int]):
-    cat_id = c.data.split(":", 1)[1]
-    catalog = load_catalog()
+async def cb_cat(c: CallbackQuery, admin_ids: set[int], outbox: Outbox):
+    _, cat_id, *rest = c.data.split(":")
+    page = parse_page(rest[0]) if rest else 0
+    catalog = await aload_catalog()
     cat = get_category(catalog, cat_id)
     if not cat:
-        await c.answer("Категория не найдена", show_alert=True)
+        outbox.put(c.answer("Категория не найдена", show_alert=True))
         return
     books = cat.get("books", [])
     if not books:
-        await c.message.edit_text(
+        outbox.put(c.message.edit_text(
             f"Категория: {cat['title']}\nПока пусто.",
-            reply_markup=kb_categories(catalog.get("categories", []))
-        )
-        await c.answer()
+            reply_markup=kb_categories(catalog.get("categories", []), version=catalog.version)
+        ))
+        outbox.put(c.answer())
         return
-    await c.message.edit_text(f"Книги: {cat['title']}", reply_markup=kb_books(books))
-    await c.answer()
+    # страницы категории перестраиваются, только когда менялась она сама
+    version = category_version(catalog, cat_id)
+    outbox.put(c.message.edit_text(f"Книги: {cat['title']}", reply_markup=kb_books(cat_id, books, page, version)))
+    outbox.put(c.answer())
 
 @router.callback_query(F.data.startswith("book:"))
-async def cb_book(c: CallbackQuery):
+async def cb_book(c: CallbackQuery, outbox: Outbox):
     book_id = c.data.split(":", 1)[1]
-    catalog = load_catalog()
+    catalog = await aload_catalog()
     book = get_book(catalog, book_id)
     if not book:
-        await c.answer("Книга не найдена", show_alert=True)
+        outbox.put(c.answer("Книга не найдена", show_alert=True))
         return
     text = (
         f"📘 {book.get('title')}\n"
@@ -75,53 +90,67 @@ async def cb_book(c: CallbackQuery):
         f"📄 Формат: {book.get('format','')}\n\n"
         f"{book.get('description','')}"
     )
-    await c.message.edit_text(text, reply_markup=kb_book_actions(book_id))
-    await c.answer()
+    outbox.put(c.message.edit_text(text, reply_markup=kb_book_actions(book_id)))
+    outbox.put(c.answer())
 
 @router.callback_query(F.data.startswith("dl:"))
-async def cb_download(c: CallbackQuery):
+async def cb_download(c: CallbackQuery, outbox: Outbox):
     book_id = c.data.split(":", 1)[1]
-    catalog = load_catalog()
+    catalog = await aload_catalog()
     book = get_book(catalog, book_id)
     if not book:
-        await c.answer("Книга не найдена", show_alert=True)
+        outbox.put(c.answer("Книга не найдена", show_alert=True))
         return
 
     file_id = book.get("file_id")
     if not file_id:
-        await c.answer("Файл не привязан (нет file_id)", show_alert=True)
+        outbox.put(c.answer("Файл не привязан (нет file_id)", show_alert=True))
         return
 
-    await c.answer()
-    await c.message.answer_document(
+    outbox.put(c.answer())
+    outbox.put(c.message.answer_document(
         document=file_id,
         caption=f"{book.get('title')} — {book.get('author','')}"
-    )
+    ))
 
 @router.callback_query(F.data == "search:ask")
-async def cb_search_ask(c: CallbackQuery, state: FSMContext):
+async def cb_search_ask(c: CallbackQuery, state: FSMContext, outbox: Outbox):
     await state.set_state(SearchFlow.waiting_query)
-    await c.message.edit_text("Напишите слово для поиска (название или автор).")
-    await c.answer()
+    outbox.put(c.message.edit_text("Напишите слово для поиска (название или автор)."))
+    outbox.put(c.answer())
+
+def search_page(catalog: dict, ranked: list[str], page: int) -> tuple[str, InlineKeyboardMarkup]:
+    page = clamp_page(page, len(ranked))
+    books = [get_book(catalog, b) for b in ranked[page * PAGE_SIZE:(page + 1) * PAGE_SIZE]]
+    return f"Нашёл: {len(ranked)}", kb_search_results(books, page, len(ranked))
 
 @router.message(SearchFlow.waiting_query, F.text)
-async def msg_search(m: Message, state: FSMContext, admin_ids: set[int]):
+async def msg_search(m: Message, state: FSMContext, admin_ids: set[int], outbox: Outbox):
     q = m.text.strip()
-    catalog = load_catalog()
-    results = search_books(catalog, q)
+    catalog = await aload_catalog()
+    ranked = await aranked_book_ids(catalog, q)
+    await state.clear()
 
-    if not results:
-        await m.answer(
+    if not ranked:
+        outbox.put(m.answer(
             "Ничего не нашёл. Попробуйте другое слово.",
             reply_markup=kb_main(is_admin(m.from_user.id, admin_ids))
-        )
-        await state.clear()
+        ))
         return
 
-    results = results[:15]
-    lines = [f"• {b['title']} — {b.get('author','')} ({b.get('_category_title','')})" for b in results]
-    await m.answer(
-        "Нашёл:\n" + "\n".join(lines) + "\n\nОткройте «Категории», чтобы скачать.",
-        reply_markup=kb_main(is_admin(m.from_user.id, admin_ids))
-    )
-    await state.clear()
+    # запрос нужен для листания страниц; сама выдача берётся из кэша поиска
+    await state.set_data({"search_query": q})
+    text, markup = search_page(catalog, ranked, 0)
+    outbox.put(m.answer(text, reply_markup=markup))
+
+@router.callback_query(F.data.startswith("sr:"))
+async def cb_search_page(c: CallbackQuery, state: FSMContext, outbox: Outbox):
+    q = (await state.get_data()).get("search_query")
+    if not q:
+        outbox.put(c.answer("Поиск устарел, начните заново", show_alert=True))
+        return
+    catalog = await aload_catalog()
+    ranked = await aranked_book_ids(catalog, q)
+    text, markup = search_page(catalog, ranked, parse_page(c.data.split(":", 1)[1]))
+    outbox.put(c.message.edit_text(text, reply_markup=markup))
+    outbox.put(c.answer())
@@ -11,3 +11,8 @@ class AdminAddFlow(StatesGroup):
     waiting_title = State()
     waiting_author = State()
     waiting_description = State()
+    waiting_meta_confirm = State()
+    waiting_duplicate_choice = State()
+
+class AdminBulkFlow(StatesGroup):
+    collecting = State()
@@ -0,0 +1,428 @@
+import mmap
+import os
+import sqlite3
+import struct
+import threading
+from pathlib import Path
+from typing import Any, Hashable
+
+from . import codec
+from .records import Book
+from .search import FIELD_WEIGHTS, MIN_PREFIX_LEN, tokenize
+
+# операции, которые копит MutableCatalog между load_catalog_for_update() и save_catalog():
+# ("category", cat_id, title) и ("book", cat_id, book)
+Op = tuple[str, str, Any]
+
+class CatalogStorage:
+    supports_search = False
+
+    def stamp(self) -> Hashable:
+        # дешёвая «версия» хранилища: меняется при любой записи, по ней кэш решает, перечитывать ли
+        raise NotImplementedError
+
+    def load(self) -> dict[str, Any]:
+        raise NotImplementedError
+
+    def save(self, catalog: dict[str, Any]) -> Hashable:
+        raise NotImplementedError
+
+    def apply(self, catalog: dict[str, Any], ops: list[Op]) -> tuple[Hashable, Hashable]:
+        # записать изменения ops (catalog — каталог уже с ними); возвращает версии до и после записи
+        before = self.stamp()
+        return before, self.save(catalog)
+
+    def changes_since(self, stamp: Hashable) -> tuple[list[Op], Hashable] | None:
+        # изменения после версии stamp и новая версия — тогда кэш пересобирает только затронутые категории;
+        # None — хранилище не может их выделить (или поменялось целиком), перечитывать всё
+        return None
+
+    def search(self, query: str, limit: int | None = None) -> list[str]:
+        raise NotImplementedError
+
+# журнал сворачивается в снимок, когда вырастает больше этого
+JOURNAL_COMPACT_BYTES = 1 << 20
+
+def replay(catalog: dict[str, Any], ops: list[Op]) -> None:
+    # повторное применение безопасно: категория перезаписывается, уже известная книга пропускается
+    cats = {c["id"]: c for c in catalog.setdefault("categories", [])}
+    book_ids = {b.get("id") for c in cats.values() for b in c.get("books", [])}
+    for kind, cat_id, payload in ops:
+        if kind == "category":
+            if cat_id in cats:
+                cats[cat_id]["title"] = payload
+            else:
+                cats[cat_id] = {"id": cat_id, "title": payload, "books": []}
+                catalog["categories"].append(cats[cat_id])
+        elif cat_id in cats and payload.get("id") not in book_ids:
+            cats[cat_id].setdefault("books", []).append(payload)
+            book_ids.add(payload.get("id"))
+
+def _file_stamp(path: Path) -> tuple[int, int, int]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return 0, 0, 0
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+class JsonStorage(CatalogStorage):
+    # catalog.json — снимок, catalog.journal — дописываемые после него изменения, по строке JSON на операцию
+    def __init__(self, path: Path):
+        self.path = path
+        self.journal_path = path.with_suffix(".journal")
+        # (отметка, до какого места журнал разобран): при недописанной последней строке
+        # разобранное кончается раньше, чем размер файла в отметке
+        self._consumed: tuple[Hashable, int] | None = None
+
+    def _ensure(self) -> None:
+        if not self.path.exists():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._write_snapshot({"categories": []})
+
+    def _read_snapshot(self) -> dict[str, Any]:
+        return codec.loads(self.path.read_bytes())
+
+    def _write_snapshot(self, catalog: dict[str, Any]) -> None:
+        # без отступов: с indent=2 файл вдвое больше и пишется дольше, читаемая копия — export_json()
+        _write_atomic(self.path, codec.dumps(catalog))
+
+    def stamp(self) -> tuple[tuple[int, int, int], tuple[int, int, int]]:
+        self._ensure()
+        return _file_stamp(self.path), _file_stamp(self.journal_path)
+
+    def _parse_journal(self, data: bytes) -> list[Op]:
+        ops = []
+        for line in data.splitlines():
+            try:
+                rec = codec.loads(line)
+            except codec.DecodeError:
+                # строка, недописанная при падении
+                continue
+            ops.append((rec["op"], rec["cat"], rec["title"] if rec["op"] == "category" else rec["book"]))
+        return ops
+
+    def _read_journal(self) -> list[Op]:
+        try:
+            return self._parse_journal(self.journal_path.read_bytes())
+        except FileNotFoundError:
+            return []
+
+    def changes_since(self, stamp: Hashable) -> tuple[list[Op], Hashable] | None:
+        # снимок тот же, журнал только дописывали — изменения это его хвост после прочитанного в прошлый раз
+        if not stamp:
+            return None
+        snapshot, journal = stamp
+        if _file_stamp(self.path) != snapshot:
+            return None
+        try:
+            f = open(self.journal_path, "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            st = os.fstat(f.fileno())
+            if journal == (0, 0, 0):
+                offset = 0
+            elif journal[2] == st.st_ino and journal[1] <= st.st_size:
+                offset = self._consumed[1] if self._consumed and self._consumed[0] == stamp else journal[1]
+            else:
+                return None
+            f.seek(offset)
+            data = f.read(st.st_size - offset)
+        # недописанную последнюю строку дочитаем в следующий раз, а отметку отдаём настоящую —
+        # иначе она никогда не совпадёт со stamp() и каждая проверка будет промахом
+        end = data.rfind(b"\n") + 1
+        new_stamp = (snapshot, (st.st_mtime_ns, st.st_size, st.st_ino))
+        self._consumed = (new_stamp, offset + end)
+        return self._parse_journal(data[:end]), new_stamp
+
+    def load(self) -> dict[str, Any]:
+        self._ensure()
+        catalog = self._read_snapshot()
+        ops = self._read_journal()
+        if ops:
+            replay(catalog, ops)
+        return catalog
+
+    def save(self, catalog: dict[str, Any]) -> tuple[tuple[int, int, int], tuple[int, int, int]]:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_snapshot(catalog)
+        # всё из журнала уже в снимке
+        self.journal_path.unlink(missing_ok=True)
+        return self.stamp()
+
+    def apply(self, catalog: dict[str, Any], ops: list[Op]) -> tuple[Hashable, Hashable]:
+        before = self.stamp()
+        lines = []
+        for kind, cat_id, payload in ops:
+            rec = {"op": kind, "cat": cat_id, ("title" if kind == "category" else "book"): payload}
+            lines.append(codec.dumps(rec) + b"\n")
+        with open(self.journal_path, "a+b") as f:
+            if f.tell():
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    # хвост от прерванной записи не должен склеиться с новой строкой
+                    lines.insert(0, b"\n")
+            f.write(b"".join(lines))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+        if size > JOURNAL_COMPACT_BYTES:
+            self.compact()
+        return before, self.stamp()
+
+    def compact(self) -> None:
+        # снимок собираем из файла, а не из переданного каталога — в журнале могут быть чужие записи
+        self.save(self.load())
+
+# бинарный снимок: заголовок (магия, длина JSON-части), JSON-часть, затем описания книг подряд в UTF-8.
+# В JSON-части — каталог без описаний и spans: по паре (смещение, длина) на книгу, -1 — описание не строка или его нет
+SNAPSHOT_MAGIC = b"BOOKCAT1"
+_SNAPSHOT_HEADER = struct.Struct("<8sQ")
+
+class BinaryStorage(JsonStorage):
+    # catalog.bin отображается в память: при загрузке разбирается только JSON-часть (id, названия, файлы),
+    # а описание книга читает из отображения, когда его спросят. Журнал изменений — как у JsonStorage
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.journal_path = path.with_name(path.name + ".journal")
+
+    def _read_snapshot(self) -> dict[str, Any]:
+        with open(self.path, "rb") as f:
+            head = f.read(_SNAPSHOT_HEADER.size)
+            magic, size = _SNAPSHOT_HEADER.unpack(head) if len(head) == _SNAPSHOT_HEADER.size else (b"", 0)
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"{self.path} is not a catalog snapshot")
+            doc = codec.loads(f.read(size))
+            # отображение живёт, пока на него ссылаются книги, — и после того, как файл заменили новым снимком
+            blob = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        base = _SNAPSHOT_HEADER.size + size
+        spans = iter(doc["spans"])
+        catalog = doc["catalog"]
+        for c in catalog.get("categories", []):
+            books = []
+            for b in c.get("books", []):
+                start, length = next(spans), next(spans)
+                books.append(Book(b, blob, (base + start) << 32 | length) if start >= 0 else Book(b))
+            c["books"] = books
+        return catalog
+
+    def _write_snapshot(self, catalog: dict[str, Any]) -> None:
+        blob = bytearray()
+        spans: list[int] = []
+        cats = []
+        for c in catalog.get("categories", []):
+            books = []
+            for b in c.get("books", []):
+                rec = dict(b)
+                desc = rec.get("description")
+                if isinstance(desc, str):
+                    del rec["description"]
+                    data = desc.encode("utf-8")
+                    spans += (len(blob), len(data))
+                    blob += data
+                else:
+                    spans += (-1, 0)
+                books.append(rec)
+            cats.append({**c, "books": books})
+        head = codec.dumps({"catalog": {**catalog, "categories": cats}, "spans": spans})
+        _write_atomic(self.path, _SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, len(head)) + head + blob)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0);
+INSERT OR IGNORE INTO meta (key, value) VALUES ('rewritten', 0);
+CREATE TABLE IF NOT EXISTS categories (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS books (
+    id TEXT PRIMARY KEY,
+    category_id TEXT NOT NULL REFERENCES categories(id),
+    data TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS books_category ON books (category_id);
+"""
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+    id UNINDEXED, title, author, description, tokenize = 'unicode61 remove_diacritics 0'
+);
+"""
+
+class SqliteStorage(CatalogStorage):
+    def __init__(self, path: Path):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        # базы, созданные до версий категорий: старые строки считаются версией 0
+        for table in ("categories", "books"):
+            if "version" not in {row[1] for row in self._conn.execute(f"PRAGMA table_info({table})")}:
+                try:
+                    self._conn.execute(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+                except sqlite3.OperationalError:
+                    # столбец только что добавил другой процесс
+                    pass
+        self._conn.execute("CREATE INDEX IF NOT EXISTS books_version ON books (version)")
+        try:
+            self._conn.executescript(_FTS_SCHEMA)
+            self.supports_search = True
+        except sqlite3.OperationalError:
+            # sqlite собран без FTS5 — поиск останется на индексе в памяти
+            self.supports_search = False
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _version(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def stamp(self) -> int:
+        with self._lock:
+            return self._version()
+
+    def load(self) -> dict[str, Any]:
+        with self._lock:
+            cats = {}
+            for cat_id, title in self._conn.execute("SELECT id, title FROM categories ORDER BY rowid"):
+                cats[cat_id] = {"id": cat_id, "title": title, "books": []}
+            for cat_id, data in self._conn.execute("SELECT category_id, data FROM books ORDER BY rowid"):
+                cats[cat_id]["books"].append(codec.loads(data))
+        return {"categories": list(cats.values())}
+
+    def changes_since(self, stamp: Hashable) -> tuple[list[Op], int] | None:
+        # каждая категория — шард со своей версией: берём только строки новее stamp
+        if not isinstance(stamp, int):
+            return None
+        with self._lock:
+            version = self._version()
+            rewritten = self._conn.execute("SELECT value FROM meta WHERE key = 'rewritten'").fetchone()[0]
+            if version < stamp or rewritten > stamp:
+                # база переписана целиком (save) — удалённые книги по версиям строк не видны
+                return None
+            ops: list[Op] = [
+                ("category", cat_id, title) for cat_id, title in self._conn.execute(
+                    "SELECT id, title FROM categories WHERE version > ? ORDER BY rowid", (stamp,)
+                )
+            ]
+            ops += [
+                ("book", cat_id, codec.loads(data)) for cat_id, data in self._conn.execute(
+                    "SELECT category_id, data FROM books WHERE version > ? ORDER BY rowid", (stamp,)
+                )
+            ]
+        return ops, version
+
+    def _upsert_category(self, cat_id: str, title: str, version: int) -> None:
+        self._conn.execute(
+            "INSERT INTO categories (id, title, version) VALUES (?, ?, ?) "
+            "ON CONFLICT (id) DO UPDATE SET title = excluded.title, version = excluded.version",
+            (cat_id, title, version),
+        )
+
+    def _insert_book(self, cat_id: str, book: dict, version: int) -> bool:
+        cur = self._conn.execute(
+            "INSERT OR IGNORE INTO books (id, category_id, data, version) VALUES (?, ?, ?, ?)",
+            (book.get("id"), cat_id, codec.dumps(book).decode("utf-8"), version),
+        )
+        if cur.rowcount and self.supports_search:
+            self._conn.execute(
+                "INSERT INTO books_fts (id, title, author, description) VALUES (?, ?, ?, ?)",
+                (book.get("id"), *(" ".join(tokenize(book.get(f) or "")) for f in FIELD_WEIGHTS)),
+            )
+        return bool(cur.rowcount)
+
+    def _write(self, fn) -> tuple[int, int]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                before = self._version()
+                fn(before + 1)
+                self._conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (before + 1,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return before, before + 1
+
+    def save(self, catalog: dict[str, Any]) -> int:
+        def write(version: int):
+            self._conn.execute("DELETE FROM books")
+            self._conn.execute("DELETE FROM categories")
+            if self.supports_search:
+                self._conn.execute("DELETE FROM books_fts")
+            self._conn.execute("UPDATE meta SET value = ? WHERE key = 'rewritten'", (version,))
+            for c in catalog.get("categories", []):
+                self._upsert_category(c["id"], c.get("title", ""), version)
+                for b in c.get("books", []):
+                    self._insert_book(c["id"], b, version)
+        return self._write(write)[1]
+
+    def apply(self, catalog: dict[str, Any], ops: list[Op]) -> tuple[int, int]:
+        def write(version: int):
+            for kind, cat_id, payload in ops:
+                if kind == "category":
+                    self._upsert_category(cat_id, payload, version)
+                elif self._insert_book(cat_id, payload, version):
+                    # новая книга — новая версия шарда её категории
+                    self._conn.execute("UPDATE categories SET version = ? WHERE id = ?", (version, cat_id))
+        return self._write(write)
+
+    def search(self, query: str, limit: int | None = None) -> list[str]:
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens:
+            return []
+        match = " ".join(f'"{t}"*' if len(t) >= MIN_PREFIX_LEN else f'"{t}"' for t in tokens)
+        weights = ", ".join(str(w) for w in FIELD_WEIGHTS.values())
+        sql = f"SELECT id FROM books_fts WHERE books_fts MATCH ? ORDER BY bm25(books_fts, 0, {weights})"
+        params: tuple = (match,)
+        if limit is not None:
+            sql += " LIMIT ?"
+            params += (limit,)
+        with self._lock:
+            return [row[0] for row in self._conn.execute(sql, params)]
+
+def open_storage(backend: str, json_path: Path, db_path: Path | None = None) -> CatalogStorage:
+    if backend == "json":
+        return JsonStorage(json_path)
+    if backend == "sqlite":
+        return SqliteStorage(db_path or json_path.with_suffix(".sqlite3"))
+    if backend == "binary":
+        return BinaryStorage(db_path or json_path.with_suffix(".bin"))
+    raise ValueError(f"Unknown catalog backend: {backend}")
+
+def migrate_json_to_sqlite(json_path: Path, db_path: Path) -> tuple[int, int]:
+    catalog = JsonStorage(json_path).load()
+    storage = SqliteStorage(db_path)
+    try:
+        storage.save(catalog)
+        loaded = storage.load()["categories"]
+    finally:
+        storage.close()
+    return len(loaded), sum(len(c["books"]) for c in loaded)
+
+def migrate_json_to_binary(json_path: Path, bin_path: Path) -> tuple[int, int]:
+    storage = BinaryStorage(bin_path)
+    storage.save(JsonStorage(json_path).load())
+    loaded = storage.load()["categories"]
+    return len(loaded), sum(len(c["books"]) for c in loaded)
+
+def export_json(storage: CatalogStorage, path: Path) -> tuple[int, int]:
+    # читаемая копия каталога из любого хранилища — JSON с отступами, как раньше писал JsonStorage
+    catalog = storage.load()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    _write_atomic(path, codec.dumps(catalog, pretty=True))
+    cats = catalog.get("categories", [])
+    return len(cats), sum(len(c.get("books", [])) for c in cats)
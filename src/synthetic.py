@@ -0,0 +1,81 @@
+import argparse
+import json
+import random
+from pathlib import Path
+from typing import Any
+
+from .catalog import slugify
+
+# слова для названий: смесь русских и транслитерированных арабских, как в настоящем каталоге
+_TITLE_WORDS = (
+    "китаб", "тафсир", "шарх", "мухтасар", "рисаля", "акыда", "фикх", "хадис", "сира", "адаб",
+    "основы", "толкование", "разъяснение", "собрание", "избранное", "наставления", "история",
+    "kitab", "tawhid", "usul", "fiqh", "arbain", "riyad", "salihin", "bulugh", "maram", "matn",
+    "ад-дин", "ас-сунна", "аль-иман", "ан-навави", "аль-бухари", "муслим", "имам", "шейх",
+)
+_AUTHOR_NAMES = (
+    "Ибн Касир", "Ан-Навави", "Аль-Бухари", "Ибн Таймия", "Аль-Газали", "Ибн Кайим", "Ас-Суюти",
+    "Ibn Hajar", "Al-Qurtubi", "Ibn Rajab", "Аш-Шафии", "Абу Ханифа", "Малик", "Ахмад",
+)
+_DESCRIPTION_WORDS = (
+    "книга", "о", "в", "и", "для", "начинающих", "комментарий", "к", "труду", "с", "примечаниями",
+    "перевод", "издание", "полное", "краткое", "изложение", "вопросов", "веры", "права", "нравов",
+)
+
+def make_book(rng: random.Random, n: int) -> dict[str, Any]:
+    title = " ".join(rng.choice(_TITLE_WORDS) for _ in range(rng.randint(2, 5))).capitalize()
+    return {
+        "id": f"{slugify(title)}-{n}",
+        "title": title,
+        "author": rng.choice(_AUTHOR_NAMES),
+        "description": " ".join(rng.choice(_DESCRIPTION_WORDS) for _ in range(rng.randint(0, 25))).capitalize(),
+        "format": rng.choice(("PDF", "EPUB")),
+        "file_id": f"BQACAgIAAxkBAAI{n:012d}",
+        "file_name": f"{slugify(title)}.pdf",
+    }
+
+def make_catalog(books: int, categories: int | None = None, seed: int = 1) -> dict[str, Any]:
+    # формат data/catalog.json; размеры категорий неравные — как в жизни, где пара разделов больше остальных
+    rng = random.Random(seed)
+    if categories is None:
+        categories = max(1, min(200, books // 100))
+    cats = [{"id": f"cat{i}", "title": f"Раздел {i + 1}", "books": []} for i in range(categories)]
+    weights = [1 / (i + 1) for i in range(categories)]
+    for n, cat in enumerate(rng.choices(cats, weights=weights, k=books)):
+        cat["books"].append(make_book(rng, n))
+    return {"categories": cats}
+
+def sample_queries(catalog: dict[str, Any], count: int, seed: int = 1) -> list[str]:
+    # запросы из слов настоящих названий и авторов, часть — обрывки слов и с опечаткой
+    rng = random.Random(seed)
+    books = [b for c in catalog["categories"] for b in c["books"]]
+    out = []
+    for _ in range(count):
+        book = rng.choice(books)
+        word = rng.choice((book["title"] + " " + book["author"]).split())
+        kind = rng.random()
+        if kind < 0.2 and len(word) > 4:
+            word = word[:rng.randint(2, len(word) - 1)]
+        elif kind < 0.3 and len(word) > 5:
+            i = rng.randrange(len(word))
+            word = word[:i] + word[i + 1:]
+        out.append(word)
+    return out
+
+# Синтетический каталог для нагрузочных тестов:
+#   python -m src.synthetic --books 200000 --out /tmp/catalog.json
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Синтетический каталог в формате data/catalog.json")
+    parser.add_argument("--books", type=int, default=10_000)
+    parser.add_argument("--categories", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+    catalog = make_catalog(args.books, args.categories, args.seed)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    args.out.write_text(json.dumps(catalog, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Готово: {len(catalog['categories'])} категорий, {args.books} книг -> {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from .config import Config
+
+log = logging.getLogger(__name__)
+
+def build_app(bot: Bot, dp: Dispatcher, cfg: Config) -> web.Application:
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=cfg.webhook_secret or None,
+    ).register(app, path=cfg.webhook_path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+async def run_webhook(bot: Bot, dp: Dispatcher, cfg: Config, register: bool = True) -> None:
+    # при нескольких воркерах вебхук регистрирует только первый
+    if register:
+        await bot.set_webhook(
+            url=cfg.webhook_url + cfg.webhook_path,
+            secret_token=cfg.webhook_secret or None,
+            allowed_updates=dp.resolve_used_update_types(),
+        )
+    runner = web.AppRunner(build_app(bot, dp, cfg))
+    await runner.setup()
+    site = web.TCPSite(runner, cfg.webhook_host, cfg.webhook_port, reuse_port=cfg.workers > 1)
+    await site.start()
+    log.info("webhook listening on %s:%s%s", cfg.webhook_host, cfg.webhook_port, cfg.webhook_path)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
@@ -0,0 +1,48 @@
+import logging
+import multiprocessing
+import time
+from typing import Callable
+
+from .config import Config
+
+log = logging.getLogger(__name__)
+
+# упавший воркер перезапускается, но не чаще, чем раз в столько секунд
+RESTART_DELAY = 1.0
+
+def check_workers_config(cfg: Config) -> None:
+    if cfg.run_mode != "webhook":
+        # getUpdates может опрашивать только один процесс
+        raise RuntimeError("BOT_WORKERS > 1 requires BOT_MODE=webhook")
+    if cfg.fsm_storage == "memory":
+        raise RuntimeError("BOT_WORKERS > 1 requires a shared FSM_STORAGE (redis or sqlite)")
+
+def run_workers(cfg: Config, target: Callable[[int], None]) -> None:
+    # каждый воркер — отдельный процесс со своим циклом событий; порт вебхука общий (SO_REUSEPORT),
+    # ядро само раскидывает соединения между процессами
+    check_workers_config(cfg)
+    ctx = multiprocessing.get_context("spawn")
+    procs: dict[int, multiprocessing.Process] = {}
+
+    def start(i: int) -> None:
+        p = ctx.Process(target=target, args=(i,), name=f"bot-worker-{i}", daemon=True)
+        p.start()
+        procs[i] = p
+        log.info("worker %s started (pid %s)", i, p.pid)
+
+    for i in range(cfg.workers):
+        start(i)
+    try:
+        while True:
+            time.sleep(RESTART_DELAY)
+            for i, p in list(procs.items()):
+                if not p.is_alive():
+                    log.warning("worker %s exited with code %s, restarting", i, p.exitcode)
+                    start(i)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for p in procs.values():
+            p.terminate()
+        for p in procs.values():
+            p.join()
@@ -0,0 +1,46 @@
+import pytest
+
+from src.bulk_import import guess_from_filename, is_manifest, iter_manifest, plan_import
+
+FILES = [
+    {"file_name": "Ибн Касир - Тафсир.pdf", "file_id": "f1", "file_unique_id": "u1", "mime": "application/pdf"},
+    {"file_name": "arbain.epub", "file_id": "f2", "file_unique_id": "u2", "mime": "application/epub+zip"},
+]
+
+def test_manifest_detection_and_filename_guess():
+    assert is_manifest("books.CSV") and is_manifest("books.json") and not is_manifest("books.pdf")
+    assert guess_from_filename("Ибн Касир — Тафсир_Ибн_Касира.pdf") == {"title": "Тафсир Ибн Касира", "author": "Ибн Касир"}
+    assert guess_from_filename("arbain.epub") == {"title": "arbain", "author": ""}
+
+@pytest.mark.parametrize("delimiter", [",", ";", "\t"])
+def test_csv_manifest_with_bom_and_any_delimiter(delimiter):
+    text = delimiter.join(["File_Name", "Title", "Category", "extra"]) + "\r\n"
+    text += delimiter.join(["arbain.epub", " Сорок хадисов ", "hadith", "x", "лишняя"]) + "\r\n"
+    rows = list(iter_manifest(text.encode("utf-8-sig"), "books.csv"))
+    assert rows == [{"file_name": "arbain.epub", "title": "Сорок хадисов", "category": "hadith"}]
+
+def test_json_manifest_as_list_or_object():
+    assert list(iter_manifest(b'[{"file_id": "f9", "title": 1}, "junk"]', "m.json")) == [{"file_id": "f9", "title": "1"}]
+    assert list(iter_manifest('{"books": [{"title": "Китаб"}]}'.encode(), "m.json")) == [{"title": "Китаб"}]
+    with pytest.raises(ValueError):
+        list(iter_manifest(b'{"books": "nope"}', "m.json"))
+
+def test_plan_import_matches_files_and_reports_problems():
+    manifest = [
+        {"file_name": "ARBAIN.epub", "title": "Сорок хадисов", "category": "Hadith", "category_title": "Хадисы"},
+        {"file_name": "missing.pdf", "title": "Нет файла"},
+        {"file_id": "remote", "title": "Уже в Telegram", "category": "bad id!"},
+    ]
+    entries, problems = plan_import(FILES, manifest, default_cat="tafsir")
+    assert [(cat, title, book["title"], book["file_id"]) for cat, title, book in entries] == [
+        ("hadith", "Хадисы", "Сорок хадисов", "f2"),
+        ("tafsir", "", "Тафсир", "f1"),
+    ]
+    # файл без строки в манифесте берёт автора и название из имени
+    assert entries[1][2]["author"] == "Ибн Касир" and entries[1][2]["format"] == "PDF"
+    assert entries[1][2]["file_unique_id"] == "u1"
+    assert len(problems) == 2 and "missing.pdf" in problems[0] and "bad id!" in problems[1]
+
+def test_plan_import_without_category_is_a_problem():
+    entries, problems = plan_import(FILES[:1], [])
+    assert entries == [] and "категория" in problems[0]
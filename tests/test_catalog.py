@@ -0,0 +1,131 @@
+import json
+
+import pytest
+
+from src import catalog as cat
+from src import codec
+from src.catalog import (
+    CatalogCache, add_book_to_category, add_books, ensure_unique_book_id, get_book, load_catalog,
+    load_catalog_for_update, save_catalog, search_books, set_storage, upsert_category
+)
+from src.interprocess import SharedVersion
+from src.storage import open_storage
+
+CATALOG = {"categories": [
+    {"id": "aqida", "title": "Акыда", "books": [{"id": "kitab", "title": "Китаб ат-таухид", "author": "Ибн Касир"}]},
+    {"id": "fiqh", "title": "Фикх", "books": [{"id": "usul", "title": "Усуль аль-фикх"}]},
+]}
+
+def plain(catalog) -> dict:
+    return json.loads(codec.dumps(catalog))
+
+@pytest.fixture(params=["json", "binary", "sqlite"])
+def backend(request, tmp_path):
+    json_path = tmp_path / "catalog.json"
+    db_path = tmp_path / ("catalog.bin" if request.param == "binary" else "catalog.sqlite3")
+    open_storage(request.param, json_path, db_path).save(CATALOG)
+    # каждый вызов — отдельный экземпляр хранилища над теми же файлами, как в другом процессе
+    storage = lambda: open_storage(request.param, json_path, db_path)
+    set_storage(storage())
+    return storage
+
+def add(cat_id: str, book: dict, title: str | None = None) -> None:
+    catalog = load_catalog_for_update()
+    if title is not None:
+        upsert_category(catalog, cat_id, title)
+    add_book_to_category(catalog, cat_id, book)
+    save_catalog(catalog)
+
+def test_partial_reload_matches_full_load(backend):
+    reader = CatalogCache(backend())
+    first = reader.get()
+    add("aqida", {"id": "sharh", "title": "Шарх"})
+    add("hadith", {"id": "arbain", "title": "Сорок хадисов"}, title="Хадисы")
+    snapshot = reader.get()
+    assert reader.stats()["partial_reloads"] == 1
+    assert plain(snapshot) == plain(CatalogCache(backend()).get())
+    # нетронутая категория переходит в новый снапшот как есть
+    assert snapshot["categories"][1] is first["categories"][1]
+    assert snapshot.shard_versions["fiqh"] == first.shard_versions["fiqh"]
+    assert snapshot.shard_versions["aqida"] == snapshot.version
+    assert get_book(snapshot, "arbain")["title"] == "Сорок хадисов"
+    assert [hit["id"] for hit in search_books(snapshot, "шарх")] == ["sharh"]
+
+def test_writer_advances_its_own_snapshot(backend):
+    before = load_catalog()
+    add("aqida", {"id": "sharh", "title": "Шарх"})
+    after = load_catalog()
+    assert after.version != before.version
+    assert plain(after) == plain(CatalogCache(backend()).get())
+    assert cat._cache.stats()["reloads"] == 0
+
+def test_partial_reload_without_changes_keeps_snapshot(tmp_path):
+    storage = open_storage("json", tmp_path / "catalog.json")
+    storage.save(CATALOG)
+    cache = CatalogCache(storage)
+    snapshot = cache.get()
+    with open(storage.journal_path, "ab") as f:
+        f.write(b'{"op":"book","cat":"aqida","bo')
+    assert cache.get() is snapshot
+    assert cache.get() is snapshot
+    assert cache.stats()["misses"] == 2 and cache.stats()["hits"] == 1
+
+def test_concurrent_edit_invalidates_cache(backend):
+    first = load_catalog_for_update()
+    second = load_catalog_for_update()
+    add_book_to_category(first, "aqida", {"id": "sharh", "title": "Шарх"})
+    add_book_to_category(second, "fiqh", {"id": "matn", "title": "Матн"})
+    save_catalog(first)
+    # second собран до записи first — его копия неполная, кэш перечитает хранилище
+    save_catalog(second)
+    snapshot = load_catalog()
+    assert get_book(snapshot, "sharh") is not None and get_book(snapshot, "matn") is not None
+    assert plain(snapshot) == plain(CatalogCache(backend()).get())
+
+def test_old_snapshot_is_not_fresh_during_reload(backend, tmp_path):
+    shared = SharedVersion(tmp_path / "catalog.version")
+    reader = CatalogCache(backend(), shared)
+    old = reader.get()
+    backend().apply({}, [("book", "aqida", {"id": "sharh", "title": "Шарх"})])
+    shared.bump()
+    seen_during_reload = []
+    storage = reader.storage
+    for name in ("changes_since", "load"):
+        def wrapped(*args, _orig=getattr(storage, name)):
+            # так выглядит кэш для cached() из цикла событий, пока get() перечитывает в потоке
+            seen_during_reload.append(reader.cached())
+            return _orig(*args)
+        setattr(storage, name, wrapped)
+    fresh = reader.get()
+    assert seen_during_reload == [None]
+    assert fresh is not old and get_book(fresh, "sharh") is not None
+    assert reader.cached() is fresh
+
+def test_snapshot_is_read_only(backend):
+    snapshot = load_catalog()
+    with pytest.raises(TypeError):
+        snapshot["categories"][0]["title"] = "x"
+    with pytest.raises(TypeError):
+        get_book(snapshot, "kitab")["title"] = "x"
+
+def test_unique_book_id_suffixes():
+    catalog = {"categories": [{"id": "c", "title": "C", "books": [
+        {"id": "kitab"}, {"id": "kitab-2"}, {"id": "kitab-5"}, {"id": "sharh-1"},
+    ]}]}
+    assert ensure_unique_book_id(catalog, "usul") == "usul"
+    assert ensure_unique_book_id(catalog, "kitab") == "kitab-6"
+    # «-1» суффиксом не считается: следующий свободный — «-2»
+    assert ensure_unique_book_id(catalog, "sharh-1") == "sharh-1-2"
+    add_book_to_category(catalog, "c", {"id": "kitab-6"})
+    assert ensure_unique_book_id(catalog, "kitab") == "kitab-7"
+
+def test_add_books_allocates_distinct_ids():
+    catalog = {"categories": [{"id": "c", "title": "C", "books": [{"id": "kitab"}]}]}
+    added, duplicates = add_books(catalog, [
+        ("c", "", {"title": "Kitab", "file_unique_id": "f1"}),
+        ("c", "", {"title": "Kitab", "file_unique_id": "f2"}),
+        ("new", "Новая", {"title": "Kitab", "file_unique_id": "f1"}),
+    ])
+    assert [b["id"] for b in added] == ["kitab-2", "kitab-3"]
+    assert [existing["id"] for _, existing in duplicates] == ["kitab-2"]
+    assert "new" not in {c["id"] for c in catalog["categories"]}
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+from src.fake_redis import FakeRedis
+
+async def call(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, *args: str) -> bytes:
+    writer.write(b"*%d\r\n" % len(args) + b"".join(b"$%d\r\n%s\r\n" % (len(a.encode()), a.encode()) for a in args))
+    await writer.drain()
+    line = await reader.readline()
+    if line.startswith(b"$") and line != b"$-1\r\n":
+        line += await reader.readexactly(int(line[1:]) + 2)
+    return line
+
+def test_resp_commands():
+    async def scenario():
+        server = FakeRedis()
+        url = await server.start()
+        host, port = url.removeprefix("redis://").rsplit("/", 1)[0].split(":")
+        reader, writer = await asyncio.open_connection(host, int(port))
+        try:
+            assert await call(reader, writer, "PING") == b"+PONG\r\n"
+            assert await call(reader, writer, "SET", "fsm:state", "collecting", "EX", "60") == b"+OK\r\n"
+            assert await call(reader, writer, "GET", "fsm:state") == b"$10\r\ncollecting\r\n"
+            assert await call(reader, writer, "TTL", "fsm:state") == b":60\r\n"
+            assert await call(reader, writer, "SET", "fsm:state", "x", "NX") == b"$-1\r\n"
+            assert await call(reader, writer, "SET", "short", "1", "PX", "1") == b"+OK\r\n"
+            await asyncio.sleep(0.01)
+            assert await call(reader, writer, "GET", "short") == b"$-1\r\n"
+            assert await call(reader, writer, "DEL", "fsm:state", "missing") == b":1\r\n"
+            assert (await call(reader, writer, "NOPE")).startswith(b"-ERR")
+            assert (await call(reader, writer, "HELLO", "4")).startswith(b"-NOPROTO")
+        finally:
+            writer.close()
+            await server.close()
+
+    asyncio.run(scenario())
+
+# redis-py 6+ по умолчанию договаривается на RESP3 через HELLO 3, 5.x остаётся на RESP2
+@pytest.mark.parametrize("protocol", [2, 3])
+def test_aiogram_redis_storage_against_stand_in(protocol):
+    pytest.importorskip("redis")
+    redis_fsm = pytest.importorskip("aiogram.fsm.storage.redis")
+    from aiogram.fsm.storage.base import StorageKey
+
+    async def scenario():
+        server = FakeRedis()
+        url = await server.start()
+        storage = redis_fsm.RedisStorage.from_url(f"{url}?protocol={protocol}", state_ttl=60, data_ttl=60)
+        key = StorageKey(bot_id=1, chat_id=2, user_id=2)
+        try:
+            await storage.set_state(key, "AdminBulkFlow:collecting")
+            await storage.set_data(key, {"bulk_files": [{"file_id": "f1"}]})
+            assert await storage.get_state(key) == "AdminBulkFlow:collecting"
+            assert await storage.get_data(key) == {"bulk_files": [{"file_id": "f1"}]}
+            await storage.set_state(key, None)
+            assert await storage.get_state(key) is None
+        finally:
+            await storage.close()
+            await server.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("aiogram")
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+
+from src.fsm_storage import SqliteFSMStorage, fsm_state_counts, update_data
+
+KEY = StorageKey(bot_id=1, chat_id=2, user_id=2)
+
+def test_sqlite_state_and_data_survive_reopen(tmp_path):
+    async def scenario():
+        storage = SqliteFSMStorage(tmp_path / "fsm.sqlite3")
+        await storage.set_state(KEY, "AdminBulkFlow:collecting")
+        await storage.set_data(KEY, {"bulk_files": [{"file_id": "f1"}], "title": "Китаб"})
+        await storage.close()
+        reopened = SqliteFSMStorage(tmp_path / "fsm.sqlite3")
+        try:
+            assert await reopened.get_state(KEY) == "AdminBulkFlow:collecting"
+            assert await reopened.get_data(KEY) == {"bulk_files": [{"file_id": "f1"}], "title": "Китаб"}
+            assert fsm_state_counts(reopened) == {"AdminBulkFlow:collecting": 1}
+            await reopened.set_state(KEY, None)
+            assert await reopened.get_state(KEY) is None
+            assert fsm_state_counts(reopened) == {}
+        finally:
+            await reopened.close()
+
+    asyncio.run(scenario())
+
+def test_sqlite_expired_dialog_starts_empty(tmp_path, monkeypatch):
+    async def scenario():
+        storage = SqliteFSMStorage(tmp_path / "fsm.sqlite3", ttl=60)
+        try:
+            await storage.set_state(KEY, "AdminFlow:title")
+            await storage.set_data(KEY, {"title": "Китаб"})
+            now = time.time()
+            monkeypatch.setattr(time, "time", lambda: now + 120)
+            assert await storage.get_state(KEY) is None
+            assert await storage.get_data(KEY) == {}
+            # запись после истечения не тянет за собой старые поля
+            await storage.set_state(KEY, "AdminFlow:author")
+            assert await storage.get_data(KEY) == {}
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+def test_fsm_context_over_sqlite(tmp_path):
+    async def scenario():
+        storage = SqliteFSMStorage(tmp_path / "fsm.sqlite3")
+        state = FSMContext(storage=storage, key=KEY)
+        try:
+            await state.set_state("AdminFlow:title")
+            assert await state.update_data(title="Китаб") == {"title": "Китаб"}
+            assert await state.update_data({"author": "Ибн Касир"}) == {"title": "Китаб", "author": "Ибн Касир"}
+            assert await state.get_data() == {"title": "Китаб", "author": "Ибн Касир"}
+            assert await state.get_state() == "AdminFlow:title"
+            await state.clear()
+            assert await state.get_data() == {} and await state.get_state() is None
+        finally:
+            await storage.close()
+
+    asyncio.run(scenario())
+
+def test_update_data_is_atomic_across_storages(tmp_path):
+    async def scenario():
+        # два экземпляра над одним файлом — как два воркера
+        storages = [SqliteFSMStorage(tmp_path / "fsm.sqlite3") for _ in range(2)]
+
+        def add(n):
+            return lambda data: data.setdefault("bulk_files", []).append(n)
+
+        try:
+            await asyncio.gather(*(update_data(storages[n % 2], KEY, add(n)) for n in range(40)))
+            assert sorted((await storages[1].get_data(KEY))["bulk_files"]) == list(range(40))
+        finally:
+            for storage in storages:
+                await storage.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+import asyncio
+import fcntl
+import os
+
+from src.interprocess import SharedVersion, WriteLock
+
+def test_shared_version_is_seen_by_other_instances(tmp_path):
+    a = SharedVersion(tmp_path / "catalog.version")
+    b = SharedVersion(tmp_path / "catalog.version")
+    assert a.read() == b.read() == 0
+    a.bump()
+    assert b.bump() == 2 and a.read() == 2
+
+def test_cancelled_wait_does_not_keep_file_lock(tmp_path):
+    path = tmp_path / "catalog.lock"
+
+    async def scenario():
+        # соседний процесс держит блокировку
+        fd = os.open(path, os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        lock = WriteLock(path)
+
+        async def take():
+            async with lock:
+                pass
+
+        waiting = asyncio.create_task(take())
+        await asyncio.sleep(0.05)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        fcntl.flock(fd, fcntl.LOCK_UN)
+        os.close(fd)
+        await asyncio.wait_for(take(), 1)
+        # и другой процесс тоже может её взять
+        other = os.open(path, os.O_RDWR)
+        fcntl.flock(other, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        os.close(other)
+
+    asyncio.run(scenario())
@@ -0,0 +1,84 @@
+import hashlib
+import zipfile
+
+from src.metadata import extract_metadata, inspect_file
+
+def make_pdf(info: bytes, broken_xref: bool = False) -> bytes:
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>", b"<< /Type /Pages /Kids [] /Count 0 >>", info]
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (num, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % (offset + 7 if broken_xref else offset)
+    out += b"trailer\n<< /Size %d /Root 1 0 R /Info 3 0 R >>\n" % (len(objects) + 1)
+    out += b"startxref\n%d\n%%%%EOF\n" % (xref + 3 if broken_xref else xref)
+    return bytes(out)
+
+INFO = (
+    b"<< /Title <FEFF0422043004440441043804400020> /Author (Ibn \\(Kathir\\) \\101l-Dimashqi)"
+    b" /Subject (Tafsir (with nested) parens\\nand escapes) >>"
+)
+
+def test_pdf_info_through_xref(tmp_path):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(make_pdf(INFO))
+    assert extract_metadata(str(path)) == {
+        "title": "Тафсир",
+        "author": "Ibn (Kathir) Al-Dimashqi",
+        "description": "Tafsir (with nested) parens and escapes",
+    }
+
+def test_pdf_with_broken_xref_falls_back_to_scan(tmp_path):
+    path = tmp_path / "book.bin"
+    path.write_bytes(make_pdf(b"<< /Title (Riyad as-Salihin) /Author <> >>", broken_xref=True))
+    # расширение не .pdf — формат узнаётся по сигнатуре
+    assert extract_metadata(str(path)) == {"title": "Riyad as-Salihin"}
+
+def test_pdf_without_info(tmp_path):
+    path = tmp_path / "book.pdf"
+    path.write_bytes(make_pdf(b"<< >>").replace(b" /Info 3 0 R", b""))
+    assert extract_metadata(str(path)) == {}
+
+def make_epub(path, opf: str, opf_name: str = "OEBPS/content.opf") -> None:
+    with zipfile.ZipFile(path, "w") as z:
+        z.writestr("mimetype", "application/epub+zip")
+        z.writestr("META-INF/container.xml", (
+            '<?xml version="1.0"?><container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">'
+            f'<rootfiles><rootfile full-path="{opf_name}" media-type="application/oebps-package+xml"/></rootfiles>'
+            "</container>"
+        ))
+        z.writestr(opf_name, opf)
+
+def test_epub_dublin_core(tmp_path):
+    path = tmp_path / "book.epub"
+    make_epub(path, (
+        '<package xmlns="http://www.idpf.org/2007/opf" version="3.0">'
+        '<metadata xmlns:dc="http://purl.org/dc/elements/1.1/">'
+        "<dc:title>  Сорок   хадисов </dc:title><dc:creator>Ан-Навави</dc:creator><dc:creator>Ибн Раджаб</dc:creator>"
+        "<dc:description>&lt;p&gt;Краткий &amp;amp; известный &lt;b&gt;сборник&lt;/b&gt;&lt;/p&gt;</dc:description>"
+        "</metadata></package>"
+    ))
+    assert extract_metadata(str(path)) == {
+        "title": "Сорок хадисов",
+        "author": "Ан-Навави, Ибн Раджаб",
+        "description": "Краткий & известный сборник",
+    }
+
+def test_epub_without_metadata_and_unknown_files(tmp_path):
+    epub = tmp_path / "book.epub"
+    make_epub(epub, '<package xmlns="http://www.idpf.org/2007/opf"/>')
+    assert extract_metadata(str(epub)) == {}
+    other = tmp_path / "notes.txt"
+    other.write_text("просто текст")
+    assert extract_metadata(str(other)) == {}
+
+def test_inspect_file_survives_broken_file(tmp_path):
+    path = tmp_path / "broken.epub"
+    path.write_bytes(b"PK\x03\x04 not really a zip")
+    meta, digest, size = inspect_file(str(path))
+    assert meta == {}
+    assert digest == hashlib.sha256(path.read_bytes()).hexdigest() and size == path.stat().st_size
@@ -0,0 +1,49 @@
+from src.metrics import Histogram, Metric, REGISTRY
+
+def metric(*args, **kwargs) -> Metric:
+    m = Metric(*args, **kwargs)
+    # в общий /metrics тестовые семейства не попадают
+    REGISTRY.remove(m)
+    return m
+
+def test_counter_keeps_full_precision():
+    m = metric("test_total", "Test counter", "counter", ("kind",))
+    c = m.labels(kind="a")
+    c.inc(1234567)
+    c.inc(3)
+    m.labels(kind="b").inc(0.1)
+    m.labels(kind="b").inc(0.2)
+    assert m.render() == [
+        "# HELP test_total Test counter",
+        "# TYPE test_total counter",
+        'test_total{kind="a"} 1234570',
+        'test_total{kind="b"} 0.30000000000000004',
+    ]
+
+def test_gauge_without_labels_and_special_values():
+    m = metric("test_gauge", "Test gauge", "gauge")
+    m.labels().set(float("inf"))
+    assert m.render()[-1] == "test_gauge +Inf"
+    m.labels().set(12345678.5)
+    assert m.render()[-1] == "test_gauge 12345678.5"
+
+def test_histogram_buckets_are_cumulative_and_labels_escaped():
+    m = metric("test_seconds", "Test histogram", "histogram", ("handler",), buckets=(0.01, 0.1))
+    h = m.labels(handler='cb "x"\n')
+    for value in (0.005, 0.05, 0.05, 3.0):
+        h.observe(value)
+    assert m.render()[2:] == [
+        'test_seconds_bucket{handler="cb \\"x\\"\\n",le="0.01"} 1',
+        'test_seconds_bucket{handler="cb \\"x\\"\\n",le="0.1"} 3',
+        'test_seconds_bucket{handler="cb \\"x\\"\\n",le="+Inf"} 4',
+        'test_seconds_sum{handler="cb \\"x\\"\\n"} 3.105',
+        'test_seconds_count{handler="cb \\"x\\"\\n"} 4',
+    ]
+
+def test_histogram_quantile_is_bucket_bound():
+    h = Histogram(buckets=(0.01, 0.1, 1.0))
+    for value in [0.005] * 98 + [0.5, 7.0]:
+        h.observe(value)
+    assert h.quantile(0.5) == 0.01
+    assert h.quantile(0.99) == 1.0
+    assert h.quantile(1.0) == 7.0
@@ -0,0 +1,88 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiogram")
+from aiogram.exceptions import TelegramBadRequest, TelegramNetworkError
+from aiogram.methods import AnswerCallbackQuery, EditMessageText, SendDocument, SendMessage
+
+from src.outbox import Outbox
+
+class FakeBot:
+    def __init__(self, failures: list[Exception] | None = None):
+        self.sent = []
+        self.failures = failures or []
+
+    async def __call__(self, method):
+        if self.failures:
+            raise self.failures.pop(0)
+        self.sent.append(method)
+        return True
+
+def edit(text: str, message_id: int = 10) -> EditMessageText:
+    return EditMessageText(chat_id=1, message_id=message_id, text=text)
+
+def run(scenario):
+    return asyncio.run(scenario())
+
+def test_answers_go_before_texts_and_documents():
+    async def scenario():
+        bot = FakeBot()
+        outbox = Outbox(bot, workers=1)
+        outbox.put(SendDocument(chat_id=1, document="file"))
+        outbox.put(SendMessage(chat_id=1, text="первое"))
+        outbox.put(AnswerCallbackQuery(callback_query_id="q"))
+        outbox.put(SendMessage(chat_id=1, text="второе"))
+        await outbox.close()
+        return [type(m).__name__ + (getattr(m, "text", None) or "") for m in bot.sent]
+
+    assert run(scenario) == ["AnswerCallbackQuery", "SendMessageпервое", "SendMessageвторое", "SendDocument"]
+
+def test_queued_edits_of_one_message_coalesce():
+    async def scenario():
+        bot = FakeBot()
+        outbox = Outbox(bot, workers=1)
+        first = outbox.put(edit("стр. 1"))
+        second = outbox.put(edit("стр. 2"))
+        outbox.put(edit("другое", message_id=11))
+        # последняя версия уходит, даже если совпадает с первой
+        outbox.put(edit("стр. 1"))
+        await outbox.close()
+        # в очереди осталась одна задача — результат получает тот, кто её поставил
+        return (await first, await second), [m.text for m in bot.sent], outbox.stats()
+
+    results, sent, stats = run(scenario)
+    assert results == (True, None)
+    assert sent == ["стр. 1", "другое"]
+    assert stats["skipped"] == 2 and stats["sent"] == 2
+
+@pytest.mark.parametrize("dedup", [True, False])
+def test_edit_equal_to_last_sent_is_dropped_only_with_dedup(dedup):
+    async def scenario():
+        bot = FakeBot()
+        outbox = Outbox(bot, workers=1, dedup_edits=dedup)
+        for text in ("стр. 1", "стр. 1", "стр. 2"):
+            await outbox.put(edit(text))
+        await outbox.close()
+        return [m.text for m in bot.sent]
+
+    assert run(scenario) == (["стр. 1", "стр. 2"] if dedup else ["стр. 1", "стр. 1", "стр. 2"])
+
+def test_retries_network_errors_and_ignores_not_modified():
+    async def scenario():
+        method = SendMessage(chat_id=1, text="x")
+        bot = FakeBot([
+            TelegramNetworkError(method, "timeout"),
+            TelegramBadRequest(method, "Bad Request: message is not modified"),
+            TelegramBadRequest(method, "Bad Request: chat not found"),
+        ])
+        outbox = Outbox(bot, workers=1, base_delay=0)
+        retried = outbox.put(edit("стр. 1"))
+        lost = outbox.put(method)
+        await outbox.close()
+        assert await retried is None
+        with pytest.raises(TelegramBadRequest):
+            await lost
+        return outbox.stats()
+
+    assert run(scenario) == {"queued": 0, "sent": 1, "skipped": 0, "failed": 1, "retries": 1}
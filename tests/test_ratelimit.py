@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+from src.ratelimit import OutboundLimiter, TokenBucket, UserRateLimiter, split_limits
+
+def test_token_bucket_burst_then_rate():
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    bucket.updated = 100.0
+    assert [bucket.try_take(100.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.try_take(100.0) == pytest.approx(0.5)
+    assert bucket.try_take(100.5) == 0.0
+    # запас не копится выше capacity
+    bucket.try_take(200.0)
+    assert bucket.tokens == pytest.approx(2)
+
+def test_user_limits_are_per_user_and_action():
+    limiter = UserRateLimiter({"search": (0.001, 2), "navigation": (0.001, 1)})
+    assert not limiter.check(1, "search") and not limiter.check(1, "search")
+    assert limiter.check(1, "search") > 0
+    assert not limiter.check(2, "search")
+    assert not limiter.check(1, "navigation")
+    # действия без лимита не считаются
+    assert limiter.check(1, "upload") == 0.0
+    assert limiter.stats()["limited"] == {"search": 1, "navigation": 0}
+
+def test_least_recent_buckets_are_evicted():
+    limiter = UserRateLimiter({"search": (0.001, 1)}, max_buckets=2)
+    limiter.check(1, "search")
+    limiter.check(2, "search")
+    limiter.check(1, "search")
+    limiter.check(3, "search")
+    # пользователь 2 трогался давнее всех — его корзина вытеснена и начнётся заново полной
+    assert limiter.stats()["buckets"] == 2
+    assert not limiter.check(2, "search")
+    assert limiter.check(3, "search") > 0
+
+def test_split_limits_keeps_at_least_one_token():
+    assert split_limits({"search": (0.5, 5), "download": (0.2, 3)}, 4) == {
+        "search": (0.125, 1.25), "download": (0.05, 1.0),
+    }
+
+def test_outbound_limiter_pauses_after_retry_after():
+    async def scenario():
+        limiter = OutboundLimiter(rate=1000)
+        limiter.pause(0.05)
+        started = asyncio.get_running_loop().time()
+        await limiter.acquire()
+        return asyncio.get_running_loop().time() - started, limiter.stats()
+
+    waited, stats = asyncio.run(scenario())
+    assert waited >= 0.04
+    assert stats == {"sent": 1, "delayed": 1, "retry_after": 1}
@@ -0,0 +1,59 @@
+import pytest
+
+from src import search
+from src.search import SearchIndex, bounded_levenshtein, normalize, tokenize
+from src.synthetic import make_catalog
+
+BOOKS = [
+    ("tafsir", {"title": "Тафсир Ибн Касира", "author": "Ибн Касир", "description": "Толкование Корана"}),
+    ("riyad", {"title": "Riyad as-Salihin", "author": "Ан-Навави", "description": "Сборник хадисов"}),
+    ("arbain", {"title": "Сорок хадисов", "author": "Ан-Навави", "description": "Краткий сборник"}),
+    ("aqida", {"title": "Акыда тахавия", "author": "Ат-Тахави", "description": ""}),
+]
+
+@pytest.fixture
+def index() -> SearchIndex:
+    return SearchIndex.build(BOOKS)
+
+def test_normalize_drops_diacritics_and_apostrophes():
+    assert normalize("Ёлка Qur'ān") == "елка quran"
+    assert tokenize("ʿАқида, ат-Тахави!") == ["ақида", "ат", "тахави"]
+
+def test_bounded_levenshtein():
+    assert bounded_levenshtein("тафсир", "тафсирр", 1) == 1
+    assert bounded_levenshtein("тафсир", "тавсир", 1) == 1
+    assert bounded_levenshtein("тафсир", "хадис", 2) is None
+
+def test_title_outranks_description(index):
+    assert index.search("хадисов") == ["arbain", "riyad"]
+
+def test_all_words_must_match(index):
+    assert index.search("навави сорок") == ["arbain"]
+    assert index.search("навави тафсир") == []
+
+def test_prefix_and_typos(index):
+    assert index.search("тахав") == ["aqida"]
+    assert index.search("тафсирр") == ["tafsir"]
+    assert index.search("тафсирр", fuzzy=False) == []
+
+def test_new_books_go_to_new_segment(index):
+    grown = index.with_books([("sharh", {"title": "Шарх акыды тахавия"})])
+    assert set(grown.search("тахавия")) == {"aqida", "sharh"}
+    assert index.search("шарх") == []
+
+def test_capped_scoring_keeps_single_word_top(monkeypatch):
+    catalog = make_catalog(3000, seed=3)
+    idx = SearchIndex.build((b["id"], b) for c in catalog["categories"] for b in c["books"])
+    monkeypatch.setattr(search, "MAX_POSTINGS_PER_TERM", 50)
+    for query in ("книга", "китаб", "тафсир"):
+        full = idx.search(query)
+        assert len(full) > 50
+        assert idx.search(query, 20) == full[:20]
+
+def test_capped_scoring_returns_only_real_matches(monkeypatch):
+    catalog = make_catalog(3000, seed=3)
+    idx = SearchIndex.build((b["id"], b) for c in catalog["categories"] for b in c["books"])
+    monkeypatch.setattr(search, "MAX_POSTINGS_PER_TERM", 50)
+    full = idx.search("книга перевод")
+    capped = idx.search("книга перевод", 20)
+    assert len(capped) == 20 and set(capped) <= set(full)